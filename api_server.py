@@ -0,0 +1,420 @@
+"""
+Optional local HTTP/JSON API over logic.py (no Streamlit needed).
+
+    python api_server.py --port 8765
+
+GET  /albums?scope=all|listened&favorites=1&wishlist=1&limit=50&cursor=...
+GET  /albums/<id>
+POST /albums/<id>/flags   {"listened": 1, "favorite": 0}
+
+Responses carry strong ETags built from the catalog and user_flags
+data versions, so clients can send If-None-Match and get 304 back.
+Reads are served from one shared in-process cache keyed by URL and
+versions; blocking DB calls run in worker threads.
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlsplit
+
+from logic import (
+    get_album_by_id,
+    get_album_links,
+    get_album_reviews,
+    get_albums_page,
+    get_data_versions,
+    get_user_album_state,
+    set_user_album_flags,
+)
+from models import init_db
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+CACHE_SIZE = 1024
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024
+
+FLAG_NAMES = ("listened", "favorite", "wishlist")
+
+REASONS = {
+    200: "OK",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# --------------------------------------
+# Shared response cache
+# --------------------------------------
+
+class ResponseCache:
+    """
+    LRU of rendered JSON bodies: key -> (versions, etag, body).
+    An entry is only valid while the data versions it was built from
+    are still current, so there is nothing to invalidate by hand.
+    Catalog-only entries ignore the user_flags version.
+    """
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, versions: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry_versions, etag, body = entry
+            if entry_versions != versions[:len(entry_versions)]:
+                return None
+            self._entries.move_to_end(key)
+            return etag, body
+
+    def put(self, key, versions: tuple, etag: str, body: bytes):
+        with self._lock:
+            self._entries[key] = (versions, etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+def make_etag(key, versions) -> str:
+    digest = hashlib.sha1(repr((key, versions)).encode("utf-8")).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+# --------------------------------------
+# Cursor helpers (keyset pagination)
+# --------------------------------------
+
+def encode_cursor(after: tuple) -> str:
+    raw = json.dumps(list(after), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        name, title, album_id = json.loads(raw)
+        return str(name), str(title), int(album_id)
+    except (ValueError, TypeError):
+        raise HTTPError(400, "Invalid cursor")
+
+
+# --------------------------------------
+# Resource builders (run in worker threads)
+# --------------------------------------
+
+def _flag(params, name) -> bool:
+    return params.get(name, ["0"])[0] in ("1", "true", "yes")
+
+
+def album_summary(album) -> dict:
+    return {
+        "id": album.id,
+        "artist": album.artist.name if album.artist else None,
+        "title": album.title,
+        "year": album.year,
+        "label": album.label,
+        "genre": album.genre,
+    }
+
+
+def build_album_list(params) -> tuple:
+    """Returns (payload, depends_on_user_state)."""
+    scope = params.get("scope", ["all"])[0]
+    if scope not in ("all", "listened"):
+        raise HTTPError(400, f"Unknown scope: {scope}")
+
+    only_favorites = _flag(params, "favorites")
+    only_wishlist = _flag(params, "wishlist")
+
+    try:
+        limit = int(params.get("limit", [PAGE_SIZE])[0])
+    except ValueError:
+        raise HTTPError(400, "Invalid limit")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    cursor = params.get("cursor", [None])[0]
+    after = decode_cursor(cursor) if cursor else None
+
+    albums, next_after = get_albums_page(
+        scope, only_favorites, only_wishlist, after=after, limit=limit,
+    )
+
+    payload = {
+        "items": [album_summary(a) for a in albums],
+        "next_cursor": encode_cursor(next_after) if next_after else None,
+    }
+    uses_user_state = scope != "all" or only_favorites or only_wishlist
+    return payload, uses_user_state
+
+
+def build_album_detail(album_id: int) -> dict:
+    album = get_album_by_id(album_id)
+    if album is None:
+        raise HTTPError(404, "Album not found")
+
+    payload = album_summary(album)
+    payload["review_url"] = album.review_url
+    payload["cover_url"] = album.cover_url
+    payload["reviews"] = [
+        {
+            "id": r.id,
+            "author": r.author,
+            "rating": r.rating,
+            "published_at": r.published_at.isoformat() if r.published_at else None,
+            "text": r.review_text,
+        }
+        for r in get_album_reviews(album_id)
+    ]
+    payload["links"] = [
+        {"id": link.id, "source": link.source, "url": link.url}
+        for link in get_album_links(album_id)
+    ]
+    payload["state"] = get_user_album_state(album_id)
+    return payload
+
+
+# --------------------------------------
+# Request handling
+# --------------------------------------
+
+class ArchiveAPI:
+    def __init__(self, cache: ResponseCache | None = None):
+        self.cache = cache or ResponseCache()
+
+    async def handle(self, method: str, target: str, headers: dict, body: bytes):
+        """Returns (status, extra_headers, body_bytes)."""
+        url = urlsplit(target)
+        parts = [p for p in url.path.split("/") if p]
+        params = parse_qs(url.query)
+
+        if parts == ["albums"]:
+            if method not in ("GET", "HEAD"):
+                raise HTTPError(405, "Use GET")
+            return await self._cached_get(
+                ("list", url.path, url.query), headers,
+                lambda: build_album_list(params),
+            )
+
+        if len(parts) >= 2 and parts[0] == "albums":
+            try:
+                album_id = int(parts[1])
+            except ValueError:
+                raise HTTPError(404, "Not found")
+
+            if len(parts) == 2:
+                if method not in ("GET", "HEAD"):
+                    raise HTTPError(405, "Use GET")
+                return await self._cached_get(
+                    ("detail", album_id), headers,
+                    lambda: (build_album_detail(album_id), True),
+                )
+
+            if parts[2:] == ["flags"]:
+                if method != "POST":
+                    raise HTTPError(405, "Use POST")
+                return await self._update_flags(album_id, body)
+
+        raise HTTPError(404, "Not found")
+
+    async def _cached_get(self, key, headers, build):
+        versions = await asyncio.to_thread(get_data_versions)
+        # user_flags, not user_state: set_last_album (UI navigation) changes
+        # nothing served here and must not invalidate ETags
+        version_key = (versions["catalog"], versions["user_flags"])
+
+        cached = self.cache.get(key, version_key)
+        if cached is None:
+            payload, uses_user_state = await asyncio.to_thread(build)
+            # Catalog-only resources keep their ETag across flag changes
+            depends_on = version_key if uses_user_state else version_key[:1]
+            etag = make_etag(key, depends_on)
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.cache.put(key, depends_on, etag, body)
+        else:
+            etag, body = cached
+
+        if etag in _split_etags(headers.get("if-none-match", "")):
+            return 304, {"ETag": etag}, b""
+        return 200, {"ETag": etag, "Content-Type": "application/json; charset=utf-8"}, body
+
+    async def _update_flags(self, album_id: int, body: bytes):
+        try:
+            flags = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "Body must be JSON")
+        if not isinstance(flags, dict):
+            raise HTTPError(400, "Body must be a JSON object")
+        # checked here, not left to set_user_album_flags(): a key such as
+        # "album_id" would clash with its positional argument
+        unknown = set(flags) - set(FLAG_NAMES)
+        if unknown:
+            raise HTTPError(400, f"Unknown flags: {', '.join(sorted(unknown))}")
+        for name, value in flags.items():
+            # only JSON 0 / 1 / true / false: "0" would otherwise be truthy
+            if not (isinstance(value, bool) or (type(value) is int and value in (0, 1))):
+                raise HTTPError(400, f"{name} must be 0, 1, true or false")
+
+        album = await asyncio.to_thread(get_album_by_id, album_id)
+        if album is None:
+            raise HTTPError(404, "Album not found")
+
+        try:
+            state = await asyncio.to_thread(set_user_album_flags, album_id, **flags)
+        except ValueError as exc:
+            raise HTTPError(400, str(exc))
+
+        body = json.dumps(state).encode("utf-8")
+        return 200, {"Content-Type": "application/json; charset=utf-8"}, body
+
+
+def _split_etags(value: str):
+    return {tag.strip() for tag in value.split(",") if tag.strip()}
+
+
+# --------------------------------------
+# Minimal HTTP/1.1 over asyncio streams
+# --------------------------------------
+
+async def _read_request(reader):
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.LimitOverrunError:
+        raise HTTPError(413, "Headers too large")
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", "0") or 0)
+    except ValueError:
+        raise HTTPError(400, "Malformed Content-Length")
+    if length < 0:
+        raise HTTPError(400, "Malformed Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "Body too large")
+    body = await reader.readexactly(length) if length else b""
+
+    return method.upper(), target, version, headers, body
+
+
+def _write_response(writer, status: int, headers: dict, body: bytes, keep_alive: bool):
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+    headers = {
+        "Content-Length": str(len(body)),
+        "Connection": "keep-alive" if keep_alive else "close",
+        "Access-Control-Allow-Origin": "*",
+        **headers,
+    }
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+
+
+async def serve_connection(api: ArchiveAPI, reader, writer):
+    try:
+        while True:
+            try:
+                method, target, version, headers, body = await _read_request(reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            except HTTPError as exc:
+                payload = json.dumps({"error": exc.message}).encode("utf-8")
+                _write_response(writer, exc.status, {}, payload, keep_alive=False)
+                break
+
+            keep_alive = (
+                headers.get("connection", "").lower() != "close"
+                and version == "HTTP/1.1"
+            )
+
+            try:
+                status, extra, payload = await api.handle(method, target, headers, body)
+            except HTTPError as exc:
+                status, extra = exc.status, {"Content-Type": "application/json"}
+                payload = json.dumps({"error": exc.message}).encode("utf-8")
+            except Exception as exc:  # keep serving other requests
+                status, extra = 500, {"Content-Type": "application/json"}
+                payload = json.dumps({"error": str(exc)}).encode("utf-8")
+
+            if method == "HEAD":
+                payload = b""
+            _write_response(writer, status, extra, payload, keep_alive)
+            await writer.drain()
+
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def start_server(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                       api: ArchiveAPI | None = None):
+    """Start listening; returns the asyncio.Server (port 0 = any free port)."""
+    api = api or ArchiveAPI()
+    return await asyncio.start_server(
+        lambda r, w: serve_connection(api, r, w),
+        host,
+        port,
+        limit=MAX_HEADER_BYTES,
+    )
+
+
+async def _serve_forever(host: str, port: int):
+    server = await start_server(host, port)
+    addr = server.sockets[0].getsockname()
+    print(f"Undead Archive API on http://{addr[0]}:{addr[1]}/albums")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local JSON API for the Undead Archive.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(argv)
+
+    init_db()
+    try:
+        asyncio.run(_serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
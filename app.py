@@ -2,16 +2,20 @@ import streamlit as st
 
 from models import init_db
 from logic import (
-    get_last_album,
     set_last_album,
     toggle_listened,
     toggle_favorite,
     toggle_wishlist,
     get_album_by_id,
-    get_user_album_state,
-    get_albums_for_scope,
-    get_album_reviews  # NEW
+    get_album_links,
 )
+from changes import change_feed
+from live_state import live_state
+from history import get_period_summary, get_rollups
+from jobs import get_queue_stats, get_recent_failures
+from link_health import get_link_health, refresh_in_background
+from snapshot import favorite_rate_by_label, get_current_snapshot, get_progress
+from review_render import get_rendered_reviews, refresh_review_renders, render_review
 
 
 # ---------------------------
@@ -19,6 +23,45 @@ from logic import (
 # ---------------------------
 init_db()  # safe to call; only creates missing tables
 
+
+@st.cache_resource
+def _prepare_review_renders():
+    # once per server process: build renders for new / changed reviews
+    return refresh_review_renders()
+
+
+_prepare_review_renders()
+
+# ---------------------------
+#  Change feed: forget checkbox states made stale by other tabs / users
+# ---------------------------
+FLAG_WIDGETS = ("listened", "favorite", "wishlist")
+
+
+def changed_album_ids(events):
+    """Album ids whose flags changed, or None if anything may have changed."""
+    if events is None or any(e.kind == "full" for e in events):
+        return None
+    return {e.album_id for e in events if e.kind == "flags"}
+
+
+def drop_stale_flag_widgets(changed_ids):
+    # a checkbox keeps its own value in session_state; if the flag changed
+    # elsewhere, that value is stale and would toggle the flag back
+    for key in list(st.session_state.keys()):
+        name, _, suffix = str(key).partition("_")
+        if name in FLAG_WIDGETS and suffix.isdigit() and (
+            changed_ids is None or int(suffix) in changed_ids
+        ):
+            del st.session_state[key]
+
+
+live_state.sync_with_db()  # throttled; picks up other processes' writes
+if "seen_seq" in st.session_state:
+    events = change_feed.changes_since(st.session_state["seen_seq"])
+    if events != []:
+        drop_stale_flag_widgets(changed_album_ids(events))
+
 # ---------------------------
 #  Sidebar controls
 # ---------------------------
@@ -41,7 +84,7 @@ elif scope == "listened":
     st.sidebar.caption("Only albums you marked as listened.")
 
 # Show last album info (if any)
-last = get_last_album()
+last = live_state.get_last_album()
 if last is not None:
     artist_name = last.artist.name if last.artist else "Unknown artist"
     st.sidebar.markdown(
@@ -49,13 +92,88 @@ if last is not None:
     )
 
 
+# ---------------------------
+#  Listening history timeline
+# ---------------------------
+with st.sidebar.expander("📈 Listening history"):
+    period = st.selectbox(
+        "Period",
+        ("week", "month", "day"),
+        index=0,
+        key="history_period",
+    )
+    period_names = {"day": "today", "week": "this week", "month": "this month"}
+
+    summary = get_period_summary(period)
+    st.markdown(
+        f"Listened **{summary['listened']}** albums {period_names[period]}"
+    )
+    if summary["favorite"] or summary["wishlist"]:
+        st.caption(
+            f"{summary['favorite']} new favorites, "
+            f"{summary['wishlist']} added to wishlist"
+        )
+
+    rollups = get_rollups(period, limit=12)
+    if rollups:
+        st.bar_chart(
+            [
+                {"period": r.period_start.isoformat(), "listened": r.listened}
+                for r in reversed(rollups)
+            ],
+            x="period",
+            y="listened",
+        )
+    else:
+        st.caption("No history yet.")
+
+
+# ---------------------------
+#  Progress (columnar snapshot, rebuilt in the background when flags change)
+# ---------------------------
+with st.sidebar.expander("📊 Progress"):
+    snap = get_current_snapshot(wait=False)  # stale is fine; refreshed in background
+    progress = get_progress(snap)
+    if progress["albums"]:
+        st.progress(
+            progress["listened"] / progress["albums"],
+            text=f"Listened {progress['listened']} of {progress['albums']}",
+        )
+    st.caption(
+        f"{progress['favorite']} favorites · {progress['wishlist']} on wishlist"
+    )
+
+    top_labels = [
+        row for row in favorite_rate_by_label(snap, user_id=1, min_albums=5)
+        if row["label"] and row["favorite"]
+    ][:5]
+    if top_labels:
+        st.caption("Labels you favorite most:")
+        for row in top_labels:
+            st.caption(f"{row['label']} — {row['favorite']} / {row['albums']}")
+
+
+# ---------------------------
+#  Background enrichment queue (read-only status)
+# ---------------------------
+with st.sidebar.expander("⚙️ Metadata enrichment"):
+    queue = get_queue_stats()
+    st.caption(
+        f"queued: {queue['queued']} · running: {queue['leased']} · "
+        f"done: {queue['done']} · failed: {queue['failed']}"
+    )
+    for job in get_recent_failures(3):
+        st.caption(f"#{job.id} {job.kind}: {job.last_error}")
+    st.caption("Run `python jobs.py work` to process the queue.")
+
+
 st.sidebar.write("---")
 
 # ---------------------------
 #  Build album list for this scope + filters
 #  (this list will be the single source of truth)
 # ---------------------------
-albums_in_scope = get_albums_for_scope(scope, only_favorites, only_wishlist)
+albums_in_scope = live_state.get_albums_for_scope(scope, only_favorites, only_wishlist)
 
 options = []
 id_by_label = {}
@@ -292,7 +410,7 @@ with header_col1:
 # ---------------------------
 st.write("### Your status for this album")
 
-state = get_user_album_state(album.id)
+state = live_state.get_user_album_state(album.id)
 
 col1, col2, col3 = st.columns(3)
 
@@ -323,6 +441,62 @@ with col3:
     if wishlist_checked != bool(state["wishlist"]):
         toggle_wishlist(album.id)
 
+
+# everything up to here (including this run's own toggles) is on screen
+st.session_state["seen_seq"] = change_feed.seq
+
+
+# ---------------------------
+#  Live updates from other tabs / users
+# ---------------------------
+@st.fragment(run_every=2)
+def watch_changes(album_id: int, filtered: bool):
+    # in-memory check; the DB is only consulted by the throttled sync
+    live_state.sync_with_db()
+    events = change_feed.changes_since(st.session_state["seen_seq"])
+    if events == []:
+        return
+
+    changed_ids = changed_album_ids(events)
+    if changed_ids is not None and album_id not in changed_ids and not (filtered and changed_ids):
+        # nothing this page shows (last_album moves, other albums' flags)
+        st.session_state["seen_seq"] = change_feed.seq
+        return
+
+    drop_stale_flag_widgets(changed_ids)
+    st.session_state["seen_seq"] = change_feed.seq
+    st.rerun()
+
+
+watch_changes(album.id, scope != "all" or only_favorites or only_wishlist)
+
+# ---------------------------
+#  Listening links + last known health
+# ---------------------------
+links = get_album_links(album.id)
+
+if links:
+    st.write("### Listen")
+
+    # statuses come from the DB; expired ones are re-checked in a
+    # background thread and show up on the next rerun
+    health = get_link_health(album.id)
+    refresh_in_background(album.id)
+
+    for link in links:
+        h = health.get(link.id)
+        if h is None or h.url_checked != link.url:
+            badge = "⏳ not checked yet"
+        elif h.ok:
+            badge = "🟢 alive"
+        else:
+            badge = f"🔴 dead ({h.status_code or h.error})"
+
+        line = f"[{link.source}]({link.url}) — {badge}"
+        if h is not None and h.ok and h.final_url and h.final_url != link.url:
+            line += f" → [moved]({h.final_url})"
+        st.markdown(line)
+
 st.write("---")
 #-----
 # OSINT block for this album
@@ -335,37 +509,11 @@ render_osint_block(album)
 st.write("---")
 st.write("### Original reviews (Russian)")
 
-reviews = get_album_reviews(album.id)
+reviews = get_rendered_reviews(album.id)
 
 if not reviews:
     st.info("No review text found for this album.")
 else:
-    for idx, rev in enumerate(reviews, start=1):
-        if len(reviews) > 1:
-            st.markdown(f"#### Review {idx}")
-
-        meta_bits = []
-        if rev.author:
-            meta_bits.append(f"**Author:** {rev.author}")
-        if rev.published_at:
-            date_str = rev.published_at.strftime("%Y-%m-%d")
-            meta_bits.append(f"**Published:** {date_str}")
-        if rev.rating is not None:
-            stars = "★" * rev.rating + "☆" * (5 - rev.rating)
-            meta_bits.append(f"Rating: {rev.rating}/5 {stars}")
-        if meta_bits:
-            st.caption(" | ".join(meta_bits))
-
-        text = (rev.review_text or "").strip()
-        paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
-
-        if not paragraphs:
-            st.write(text)
-        else:
-            for p in paragraphs:
-                st.write(p)
-                st.write("")
-
-        st.write("---")
-
-
+    for idx, rendered in enumerate(reviews, start=1):
+        heading = f"Review {idx}" if len(reviews) > 1 else None
+        render_review(st, rendered, heading)
@@ -0,0 +1,368 @@
+"""
+Artist name canonicalisation and deduplication.
+
+Artist.name is unique by exact string, so "Dead Can Dance",
+"DEAD CAN DANCE" and "Dead-Can-Dance" are three artists, and
+"ALBIREON / ZERESH" is unrelated to ALBIREON. This pass links them
+through artist_aliases without touching artist names.
+
+Only artists sharing a blocking key are compared (normalised tokens,
+compact form, phonetic code), so the work is near-linear in the number
+of names. Artists already processed keep their keys in
+artist_block_keys, so re-running after an import only looks at the
+new names.
+
+    python artist_resolution.py            # link new artists
+    python artist_resolution.py --merge    # also move albums to the canonical artist
+"""
+
+import argparse
+import re
+import unicodedata
+from datetime import datetime, timezone
+from difflib import SequenceMatcher
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from logic import bump_version
+from models import SessionLocal, Album, Artist, ArtistAlias, ArtistBlockKey, init_db
+
+
+MATCH_THRESHOLD = 0.9
+
+# Blocks bigger than this are too generic to be useful (e.g. "the")
+MAX_BLOCK_SIZE = 50
+
+QUERY_CHUNK = 500
+
+_CYRILLIC = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e",
+    "ж": "zh", "з": "z", "и": "i", "й": "i", "к": "k", "л": "l", "м": "m",
+    "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "h", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sch", "ъ": "",
+    "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+}
+
+_COLLAB_SPLIT = re.compile(r"\s*(?:/|&|\+|\bfeat\.?|\bft\.|\bvs\.?|\bwith\b)\s*", re.IGNORECASE)
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+_SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"),
+    **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"),
+    "l": "4",
+    **dict.fromkeys("mn", "5"),
+    "r": "6",
+}
+
+
+# --------------------------------------
+# Normalisation and keys
+# --------------------------------------
+
+def normalise_name(name: str | None) -> str:
+    """
+    Lowercase ASCII tokens separated by single spaces:
+    accents stripped, Cyrillic transliterated, punctuation dropped,
+    a leading "the" removed.
+    """
+    text = unicodedata.normalize("NFKD", (name or "").casefold())
+    text = "".join(_CYRILLIC.get(ch, ch) for ch in text if not unicodedata.combining(ch))
+    text = _NON_ALNUM.sub(" ", text).strip()
+    if text.startswith("the "):
+        text = text[4:]
+    return text
+
+
+def soundex(token: str) -> str:
+    if not token:
+        return ""
+    first = token[0]
+    code = first.upper()
+    last = _SOUNDEX_CODES.get(first, "")
+    for ch in token[1:]:
+        digit = _SOUNDEX_CODES.get(ch, "")
+        if digit and digit != last:
+            code += digit
+        if ch not in "hw":
+            last = digit
+    return (code + "000")[:4]
+
+
+def blocking_keys(name: str | None) -> set:
+    """
+    Keys that near-duplicate names are likely to share:
+    sorted tokens, the name without spaces, and a per-token phonetic code.
+    """
+    normalised = normalise_name(name)
+    if not normalised:
+        return set()
+
+    tokens = normalised.split()
+    return {
+        "t:" + " ".join(sorted(tokens)),
+        "c:" + "".join(tokens),
+        "p:" + " ".join(soundex(t) if t.isalpha() else t for t in tokens),
+    }
+
+
+def split_collaboration(name: str | None) -> list:
+    """'ALBIREON / ZERESH' -> ['ALBIREON', 'ZERESH']; single artists -> []."""
+    parts = [p.strip() for p in _COLLAB_SPLIT.split(name or "") if p.strip()]
+    return parts if len(parts) > 1 else []
+
+
+def similarity(a: str, b: str) -> float:
+    """Score two names in 0..1 (1.0 = same normalised name)."""
+    na, nb = normalise_name(a), normalise_name(b)
+    if not na or not nb:
+        return 0.0
+    if na == nb:
+        return 1.0
+
+    ta, tb = set(na.split()), set(nb.split())
+    token_score = len(ta & tb) / len(ta | tb)
+    char_score = SequenceMatcher(None, na.replace(" ", ""), nb.replace(" ", "")).ratio()
+    return max(token_score, char_score)
+
+
+# --------------------------------------
+# Union-find over artist ids
+# --------------------------------------
+
+class _Clusters:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        self.parent.setdefault(x, x)
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[rb] = ra
+
+    def groups(self):
+        out = {}
+        for x in self.parent:
+            out.setdefault(self.find(x), set()).add(x)
+        return out.values()
+
+
+# --------------------------------------
+# Resolution pass
+# --------------------------------------
+
+def _chunks(items, size=QUERY_CHUNK):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _pick_canonical(members: set, aliases: dict, album_counts: dict) -> int:
+    """
+    Keep an existing canonical artist if the cluster has one,
+    otherwise the artist with the most albums (then lowest id).
+    """
+    existing = members & set(aliases.values())
+    if existing:
+        return min(existing)
+    return max(members, key=lambda m: (album_counts.get(m, 0), -m))
+
+
+def resolve_artists(threshold: float = MATCH_THRESHOLD,
+                    max_block_size: int = MAX_BLOCK_SIZE,
+                    merge: bool = False) -> dict:
+    """
+    Link artists that were never resolved to their duplicates.
+    With merge=True, albums of alias artists are moved to the canonical one.
+    Returns {"new_artists", "compared", "aliases", "collabs", "merged_albums"}.
+    """
+    stats = dict.fromkeys(("new_artists", "compared", "aliases", "collabs", "merged_albums"), 0)
+
+    db = SessionLocal()
+    try:
+        # 1. artists that have no blocking keys yet
+        new_artists = dict(
+            db.query(Artist.id, Artist.name)
+            .outerjoin(ArtistBlockKey, ArtistBlockKey.artist_id == Artist.id)
+            .filter(ArtistBlockKey.artist_id.is_(None))
+        )
+        stats["new_artists"] = len(new_artists)
+        if not new_artists:
+            return stats
+
+        # names with nothing left after normalisation get a private key,
+        # so they are still marked as processed
+        new_keys = {
+            artist_id: blocking_keys(name) or {f"id:{artist_id}"}
+            for artist_id, name in new_artists.items()
+        }
+        db.execute(
+            ArtistBlockKey.__table__.insert(),
+            [
+                {"artist_id": artist_id, "key": key}
+                for artist_id, keys in new_keys.items()
+                for key in keys
+            ],
+        )
+
+        # 2. blocks touched by the new artists (old and new members)
+        blocks = {}
+        for chunk in _chunks({k for keys in new_keys.values() for k in keys}):
+            for artist_id, key in db.query(ArtistBlockKey.artist_id, ArtistBlockKey.key).filter(
+                ArtistBlockKey.key.in_(chunk)
+            ):
+                blocks.setdefault(key, set()).add(artist_id)
+
+        names = dict(new_artists)
+        known_ids = {m for members in blocks.values() for m in members} - set(names)
+        for chunk in _chunks(known_ids):
+            names.update(db.query(Artist.id, Artist.name).filter(Artist.id.in_(chunk)))
+
+        aliases = dict(db.query(ArtistAlias.artist_id, ArtistAlias.canonical_artist_id))
+
+        # 3. score candidate pairs inside each block
+        clusters = _Clusters()
+        scores = {}
+        seen = set()
+        for members in blocks.values():
+            if len(members) < 2 or len(members) > max_block_size:
+                continue
+            for a in members:
+                if a not in new_artists:
+                    continue
+                for b in members:
+                    if a == b or (b in new_artists and b < a):
+                        continue
+                    pair = (min(a, b), max(a, b))
+                    if pair in seen:
+                        continue
+                    seen.add(pair)
+                    stats["compared"] += 1
+
+                    score = similarity(names[a], names[b])
+                    if score >= threshold:
+                        clusters.union(a, b)
+                        # pull in b's existing canonical artist, if any
+                        clusters.union(b, aliases.get(b, b))
+                        scores[a] = max(scores.get(a, 0.0), score)
+                        scores[b] = max(scores.get(b, 0.0), score)
+
+        # 4. one canonical artist per cluster
+        groups = [members for members in clusters.groups() if len(members) > 1]
+
+        album_counts = {}
+        for chunk in _chunks({m for members in groups for m in members}):
+            album_counts.update(
+                db.query(Album.artist_id, func.count(Album.id))
+                .filter(Album.artist_id.in_(chunk))
+                .group_by(Album.artist_id)
+            )
+
+        new_aliases = {}
+        for members in groups:
+            canonical = _pick_canonical(members, aliases, album_counts)
+            for member in members:
+                if member == canonical or aliases.get(member) == canonical:
+                    continue
+                new_aliases[member] = (canonical, "variant", scores.get(member))
+
+        # 5. collaborations: "A / B" where A and B are known artists
+        for artist_id, name in new_artists.items():
+            if artist_id in new_aliases or artist_id in aliases:
+                continue
+            parts = split_collaboration(name)
+            if not parts:
+                continue
+            member_ids = []
+            for part in parts:
+                compact = "c:" + normalise_name(part).replace(" ", "")
+                match = (
+                    db.query(ArtistBlockKey.artist_id)
+                    .filter(ArtistBlockKey.key == compact, ArtistBlockKey.artist_id != artist_id)
+                    .first()
+                )
+                if match is None:
+                    break
+                member_ids.append(match[0])
+            else:
+                # group the collaboration under its first member
+                first = member_ids[0]
+                if first in new_aliases:
+                    canonical = new_aliases[first][0]
+                else:
+                    canonical = aliases.get(first, first)
+                new_aliases[artist_id] = (canonical, "collab", 1.0)
+
+        # 6. write aliases (re-pointing old aliases of a merged canonical too)
+        now = datetime.now(timezone.utc)
+        if new_aliases:
+            stmt = sqlite_insert(ArtistAlias.__table__)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["artist_id"],
+                set_={col: stmt.excluded[col] for col in ("canonical_artist_id", "kind", "score")},
+            )
+            db.execute(stmt, [
+                {
+                    "artist_id": artist_id,
+                    "canonical_artist_id": canonical,
+                    "kind": kind,
+                    "score": score,
+                    "created_at": now,
+                }
+                for artist_id, (canonical, kind, score) in new_aliases.items()
+            ])
+        for canonical, kind, score in new_aliases.values():
+            stats["collabs" if kind == "collab" else "aliases"] += 1
+
+        # a former canonical artist that became an alias hands over its aliases
+        former_canonicals = set(aliases.values())
+        for artist_id, (canonical, _, _) in new_aliases.items():
+            if artist_id not in former_canonicals:
+                continue
+            db.query(ArtistAlias).filter(
+                ArtistAlias.canonical_artist_id == artist_id
+            ).update({ArtistAlias.canonical_artist_id: canonical}, synchronize_session=False)
+
+        if merge:
+            variants = [a for a, (_, kind, _) in new_aliases.items() if kind == "variant"]
+            for artist_id in variants:
+                stats["merged_albums"] += (
+                    db.query(Album)
+                    .filter(Album.artist_id == artist_id)
+                    .update({Album.artist_id: new_aliases[artist_id][0]}, synchronize_session=False)
+                )
+
+        if new_aliases:
+            bump_version(db, "catalog")
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Link duplicate artist names.")
+    parser.add_argument("--threshold", type=float, default=MATCH_THRESHOLD)
+    parser.add_argument("--merge", action="store_true",
+                        help="move albums of variant artists to the canonical artist")
+    args = parser.parse_args(argv)
+
+    init_db()
+    stats = resolve_artists(threshold=args.threshold, merge=args.merge)
+    print(", ".join(f"{name}: {value}" for name, value in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Throughput benchmark for api_server.py against a local keep-alive client.
+
+    python bench_api.py --requests 5000 --concurrency 16
+
+Runs the server on a free port in a background thread, then fires
+album list / detail requests (half of them conditional) and reports
+requests per second plus p50 / p99 latency.
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import threading
+import time
+
+from api_server import start_server
+from logic import get_albums_page
+from models import init_db
+
+
+def _run_server(ready: threading.Event, holder: dict):
+    async def runner():
+        server = await start_server("127.0.0.1", 0)
+        holder["port"] = server.sockets[0].getsockname()[1]
+        ready.set()
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(runner())
+    except asyncio.CancelledError:
+        pass
+
+
+async def _request(reader, writer, path: str, etag: str | None = None):
+    lines = [f"GET {path} HTTP/1.1", "Host: localhost"]
+    if etag:
+        lines.append(f"If-None-Match: {etag}")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    await writer.drain()
+
+    head = await reader.readuntil(b"\r\n\r\n")
+    headers = {}
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    for line in header_lines:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", "0"))
+    if length:
+        await reader.readexactly(length)
+    return int(status_line.split(" ")[1]), headers.get("etag")
+
+
+async def _client(port: int, paths: list, count: int, latencies: list, statuses: dict):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    etags = {}
+    try:
+        for _ in range(count):
+            path = random.choice(paths)
+            # every other request is a conditional GET
+            etag = etags.get(path) if random.random() < 0.5 else None
+            started = time.perf_counter()
+            status, new_etag = await _request(reader, writer, path, etag)
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+            if new_etag:
+                etags[path] = new_etag
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def _bench(port: int, total: int, concurrency: int):
+    albums, _ = get_albums_page(limit=200)
+    paths = ["/albums", "/albums?limit=100", "/albums?scope=listened"]
+    paths += [f"/albums/{a.id}" for a in albums]
+
+    latencies = []
+    statuses = {}
+    per_client = max(1, total // concurrency)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        _client(port, paths, per_client, latencies, statuses)
+        for _ in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - started
+    return latencies, statuses, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the local API server.")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    init_db()
+
+    ready = threading.Event()
+    holder = {}
+    threading.Thread(target=_run_server, args=(ready, holder), daemon=True).start()
+    ready.wait()
+
+    latencies, statuses, elapsed = asyncio.run(
+        _bench(holder["port"], args.requests, args.concurrency)
+    )
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"requests:    {len(latencies)} ({args.concurrency} connections)")
+    print(f"statuses:    {dict(sorted(statuses.items()))}")
+    print(f"throughput:  {len(latencies) / elapsed:.0f} req/s")
+    print(f"latency p50: {statistics.median(latencies) * 1000:.2f} ms")
+    print(f"latency p99: {p99 * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
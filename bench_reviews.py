@@ -0,0 +1,115 @@
+"""
+Compare the old per-paragraph review rendering with precomputed renders.
+
+    python bench_reviews.py --albums 20
+
+Picks the albums with the longest review text, then counts Streamlit
+element deltas and times one "rerun" of the review section both ways.
+Streamlit itself is replaced by a recorder, so this only needs the DB.
+"""
+
+import argparse
+import time
+
+from sqlalchemy import func
+
+from logic import get_album_reviews
+from models import SessionLocal, Review, init_db
+from review_render import get_rendered_reviews, refresh_review_renders, render_review
+
+
+class DeltaRecorder:
+    """Stands in for `st`: every call is one element delta."""
+
+    def __init__(self):
+        self.deltas = 0
+
+    def _record(self, *args, **kwargs):
+        self.deltas += 1
+
+    write = markdown = caption = _record
+
+
+def legacy_render(st, reviews):
+    """The review section as app.py drew it before review_renders."""
+    for idx, rev in enumerate(reviews, start=1):
+        if len(reviews) > 1:
+            st.markdown(f"#### Review {idx}")
+
+        meta_bits = []
+        if rev.author:
+            meta_bits.append(f"**Author:** {rev.author}")
+        if rev.published_at:
+            date_str = rev.published_at.strftime("%Y-%m-%d")
+            meta_bits.append(f"**Published:** {date_str}")
+        if rev.rating is not None:
+            stars = "★" * rev.rating + "☆" * (5 - rev.rating)
+            meta_bits.append(f"Rating: {rev.rating}/5 {stars}")
+        if meta_bits:
+            st.caption(" | ".join(meta_bits))
+
+        text = (rev.review_text or "").strip()
+        paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
+
+        if not paragraphs:
+            st.write(text)
+        else:
+            for p in paragraphs:
+                st.write(p)
+                st.write("")
+
+        st.write("---")
+
+
+def precomputed_render(st, reviews):
+    for idx, rendered in enumerate(reviews, start=1):
+        heading = f"Review {idx}" if len(reviews) > 1 else None
+        render_review(st, rendered, heading)
+
+
+def _longest_album_ids(limit: int):
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(Review.album_id, func.sum(func.length(Review.review_text)).label("size"))
+            .group_by(Review.album_id)
+            .order_by(func.sum(func.length(Review.review_text)).desc())
+            .limit(limit)
+            .all()
+        )
+        return [album_id for album_id, _ in rows]
+    finally:
+        db.close()
+
+
+def _measure(album_ids, load, draw, repeat: int):
+    recorder = DeltaRecorder()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for album_id in album_ids:
+            draw(recorder, load(album_id))
+    elapsed = time.perf_counter() - started
+    reruns = repeat * len(album_ids)
+    return recorder.deltas / reruns, elapsed / reruns * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark review rendering.")
+    parser.add_argument("--albums", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    init_db()
+    refresh_review_renders()
+    album_ids = _longest_album_ids(args.albums)
+
+    old_deltas, old_ms = _measure(album_ids, get_album_reviews, legacy_render, args.repeat)
+    new_deltas, new_ms = _measure(album_ids, get_rendered_reviews, precomputed_render, args.repeat)
+
+    print(f"albums (longest reviews): {len(album_ids)}")
+    print(f"legacy:      {old_deltas:7.1f} deltas/rerun  {old_ms:7.2f} ms/rerun")
+    print(f"precomputed: {new_deltas:7.1f} deltas/rerun  {new_ms:7.2f} ms/rerun")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+In-process change feed for user state.
+
+Every write that bumps the "user_state" data version (flag toggles,
+set_last_album) publishes a ChangeEvent here with that version.
+Events are numbered by a feed sequence in publish order, not by the
+DB version: two writers can commit versions 5 and 6 and publish them
+as 6, 5, and a reader that has seen up to 6 must still get 5.
+Streamlit sessions remember the `seq` they rendered and ask for
+changes_since() it; caches subscribe() and drop only the affected
+entries. Nothing here touches the DB except sync_with_db(), which
+callers throttle.
+
+The feed remembers the last DB version it knows about. A local write
+whose version skips past it means another process wrote in between,
+so that event goes out as "full"; likewise sync_with_db() publishes
+"full" whenever the DB version differs from the one the feed knows.
+"""
+
+import threading
+from collections import deque, namedtuple
+
+
+# seq: position in this feed (publish order)
+# version: DB user_state version the write produced
+# kind: "flags" / "last_album" / "full" (unknown change, refresh everything)
+ChangeEvent = namedtuple("ChangeEvent", ["seq", "version", "kind", "album_id"])
+
+HISTORY_SIZE = 1000
+
+
+class ChangeFeed:
+    def __init__(self, history: int = HISTORY_SIZE):
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._db_version = 0
+        self._events = deque(maxlen=history)
+        # seq right before the oldest retained event
+        self._floor = 0
+        self._subscribers = []
+
+    @property
+    def seq(self) -> int:
+        """Sequence number of the latest event; pass it to changes_since() later."""
+        return self._seq
+
+    @property
+    def db_version(self) -> int:
+        """Last DB user_state version this feed knows about."""
+        return self._db_version
+
+    def publish(self, kind: str, album_id: int | None = None,
+                version: int | None = None) -> ChangeEvent:
+        """
+        Record a change. `version` is the DB data version the write
+        produced; without it the DB version is taken as one higher.
+        If the version is not the next one after the last known, some
+        other process wrote in between and the event becomes "full".
+        """
+        with self._lock:
+            if version is None:
+                version = self._db_version + 1
+            if version > self._db_version + 1:
+                kind, album_id = "full", None
+            event = self._append(kind, album_id, version)
+            self._db_version = max(self._db_version, version)
+            subscribers = list(self._subscribers)
+        self._notify(subscribers, event)
+        return event
+
+    def _append(self, kind, album_id, version) -> ChangeEvent:
+        # caller holds self._lock
+        if len(self._events) == self._events.maxlen:
+            self._floor = self._events[0].seq
+        self._seq += 1
+        event = ChangeEvent(self._seq, version, kind, album_id)
+        self._events.append(event)
+        return event
+
+    @staticmethod
+    def _notify(subscribers, event):
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception:
+                # a broken cache must not break the write that published
+                pass
+
+    def changes_since(self, seq: int):
+        """
+        Events published after `seq`, in publish order.
+        None means the history no longer reaches back that far:
+        treat it as "everything may have changed".
+        """
+        with self._lock:
+            if seq >= self._seq:
+                return []
+            if seq < self._floor:
+                return None
+            return [e for e in self._events if e.seq > seq]
+
+    def subscribe(self, callback):
+        """callback(event) runs in the publishing thread. Returns an unsubscribe function."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+
+        return unsubscribe
+
+    def sync_with_db(self, db_version: int):
+        """
+        Catch up with writes made by other processes (API server, sync
+        import): if the DB version is not the one this feed knows,
+        publish a "full" event at it.
+        """
+        with self._lock:
+            if db_version == self._db_version:
+                return
+            event = self._append("full", None, db_version)
+            self._db_version = db_version
+            subscribers = list(self._subscribers)
+        self._notify(subscribers, event)
+
+
+# One feed per process, shared by all Streamlit sessions
+change_feed = ChangeFeed()
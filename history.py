@@ -0,0 +1,334 @@
+import atexit
+import threading
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from models import SessionLocal, UserAlbumEvent, UserAlbumRollup, worker_engine
+
+
+FLAGS = ("listened", "favorite", "wishlist")
+PERIODS = ("day", "week", "month")
+
+# Events are buffered in memory and written together:
+# whichever comes first — this many events, or this many seconds.
+FLUSH_BATCH_SIZE = 20
+FLUSH_INTERVAL_SECONDS = 5.0
+
+_pending = []
+_pending_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+# Shape of get_events() rows, for events not written yet
+PendingEvent = namedtuple("PendingEvent", ["ts", "album_id", "field", "value"])
+
+
+# --------------------------------------
+# Bucketing helpers
+# --------------------------------------
+
+def period_start(day: date, period: str) -> date:
+    """
+    First day of the bucket that contains `day`.
+    Weeks start on Monday, months on the 1st.
+    """
+    if period == "day":
+        return day
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Unknown period: {period}")
+
+
+# --------------------------------------
+# Writing events (toggle path)
+# --------------------------------------
+
+def record_event(album_id: int, field: str, value: int,
+                 user_id: int = 1, ts: datetime | None = None):
+    """
+    Queue one flag change. The queue is written to the DB in batches,
+    so a toggle costs one list append most of the time.
+    """
+    if field not in FLAGS:
+        raise ValueError(f"Unknown flag: {field}")
+
+    event = {
+        "user_id": user_id,
+        "album_id": album_id,
+        "field": field,
+        "value": int(value),
+        "ts": ts or datetime.now(timezone.utc),
+    }
+
+    with _pending_lock:
+        _pending.append(event)
+        due = (
+            len(_pending) >= FLUSH_BATCH_SIZE
+            or time.monotonic() - _last_flush >= FLUSH_INTERVAL_SECONDS
+        )
+
+    if due:
+        flush_events()
+
+
+def _utc(ts: datetime) -> datetime:
+    # SQLite hands back naive datetimes; they are stored as UTC
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(timezone.utc)
+
+
+def _buckets(ts: datetime):
+    day = _utc(ts).date()
+    return [(period, period_start(day, period)) for period in PERIODS]
+
+
+def _rollup_increments(db, events):
+    """
+    How much `events` change the rollups:
+    (user_id, period, period_start) -> {flag: delta}.
+
+    A bucket counts an album once if its flag was switched on in that
+    bucket and the bucket's latest event for it is still "on". So the
+    delta for (album, flag, bucket) is latest-value-after minus
+    latest-value-before these events; switching off again undoes the
+    count, and toggling back and forth counts at most once.
+    Reads earlier events of the touched albums; writes nothing.
+    """
+    events = sorted(events, key=lambda e: _utc(e["ts"]))
+
+    # (user, album, field) -> earliest bucket start the events touch
+    earliest = {}
+    after = {}
+    for event in events:
+        key = (event["user_id"], event["album_id"], event["field"])
+        buckets = _buckets(event["ts"])
+        first = min(start for _, start in buckets)
+        earliest[key] = min(earliest.get(key, first), first)
+        for period, start in buckets:
+            after[key + (period, start)] = event["value"]
+
+    before = {}
+    for (user_id, album_id, field), first in earliest.items():
+        since = datetime.combine(first, datetime.min.time(), timezone.utc)
+        rows = (
+            db.query(UserAlbumEvent.ts, UserAlbumEvent.value)
+            .filter(
+                UserAlbumEvent.user_id == user_id,
+                UserAlbumEvent.ts >= since,
+                UserAlbumEvent.album_id == album_id,
+                UserAlbumEvent.field == field,
+            )
+            .order_by(UserAlbumEvent.ts.asc(), UserAlbumEvent.id.asc())
+        )
+        for ts, value in rows:
+            for period, start in _buckets(ts):
+                before[(user_id, album_id, field, period, start)] = value
+
+    increments = {}
+    for (user_id, album_id, field, period, start), value in after.items():
+        delta = value - before.get((user_id, album_id, field, period, start), 0)
+        if delta:
+            counts = increments.setdefault((user_id, period, start), dict.fromkeys(FLAGS, 0))
+            counts[field] += delta
+    return increments
+
+
+def _pending_snapshot():
+    with _pending_lock:
+        return _pending[:]
+
+
+def flush_events() -> int:
+    """
+    Write all queued events and fold them into the rollup tables,
+    in a single transaction. Returns how many events were written.
+
+    Flushes are serialised: the deltas compare against events already
+    in the DB, so two batches for the same album must not compute them
+    side by side (each would miss the other's events and double-count).
+    A module lock orders flushes in this process; BEGIN IMMEDIATE (see
+    models.worker_engine) orders them against other processes.
+    """
+    global _last_flush
+
+    with _flush_lock:
+        with _pending_lock:
+            batch = _pending[:]
+            _pending.clear()
+            _last_flush = time.monotonic()
+
+        if not batch:
+            return 0
+
+        db = Session(worker_engine)
+        try:
+            # before the insert: the deltas compare against earlier events
+            increments = _rollup_increments(db, batch)
+
+            db.execute(UserAlbumEvent.__table__.insert(), batch)
+
+            for (user_id, period, start), counts in increments.items():
+                stmt = sqlite_insert(UserAlbumRollup.__table__).values(
+                    user_id=user_id,
+                    period=period,
+                    period_start=start,
+                    **counts,
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["user_id", "period", "period_start"],
+                    set_={
+                        flag: getattr(UserAlbumRollup.__table__.c, flag) + counts[flag]
+                        for flag in FLAGS
+                    },
+                )
+                db.execute(stmt)
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            # put the batch back so nothing is lost on a transient error
+            with _pending_lock:
+                _pending[:0] = batch
+            raise
+        finally:
+            db.close()
+
+    return len(batch)
+
+
+# Do not lose the tail of the buffer when the app shuts down
+atexit.register(flush_events)
+
+
+# --------------------------------------
+# Reading history (timeline view)
+# --------------------------------------
+
+def get_rollups(period: str = "week", limit: int = 12, user_id: int = 1):
+    """
+    Return the latest `limit` buckets for the given period,
+    newest first. Reads the small rollup table; events still in the
+    buffer are added in memory (reading never forces a flush).
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period: {period}")
+
+    pending = _pending_snapshot()
+
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(UserAlbumRollup)
+            .filter_by(user_id=user_id, period=period)
+            .order_by(UserAlbumRollup.period_start.desc())
+            .limit(limit)
+            .all()
+        )
+        if not pending:
+            return rows
+        increments = _rollup_increments(db, pending)
+        # detached from here on: the additions below are never written
+        db.expunge_all()
+    finally:
+        db.close()
+
+    by_start = {row.period_start: row for row in rows}
+    for (event_user, event_period, start), counts in increments.items():
+        if event_user != user_id or event_period != period:
+            continue
+        row = by_start.get(start)
+        if row is None:
+            row = by_start[start] = UserAlbumRollup(
+                user_id=user_id, period=period, period_start=start,
+                **dict.fromkeys(FLAGS, 0),
+            )
+        for flag in FLAGS:
+            setattr(row, flag, (getattr(row, flag) or 0) + counts[flag])
+
+    rows = sorted(by_start.values(), key=lambda row: row.period_start, reverse=True)
+    return rows[:limit]
+
+
+def get_period_summary(period: str = "week", user_id: int = 1,
+                       today: date | None = None):
+    """
+    Counts for the bucket containing `today` (UTC),
+    e.g. {"listened": 14, "favorite": 2, "wishlist": 0}.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period: {period}")
+
+    pending = _pending_snapshot()
+
+    today = today or datetime.now(timezone.utc).date()
+    start = period_start(today, period)
+
+    db = SessionLocal()
+    try:
+        row = (
+            db.query(UserAlbumRollup)
+            .filter_by(user_id=user_id, period=period, period_start=start)
+            .one_or_none()
+        )
+        increments = _rollup_increments(db, pending) if pending else {}
+    finally:
+        db.close()
+
+    summary = dict.fromkeys(FLAGS, 0)
+    if row is not None:
+        summary = {flag: getattr(row, flag) or 0 for flag in FLAGS}
+
+    for flag, delta in increments.get((user_id, period, start), {}).items():
+        summary[flag] += delta
+    return summary
+
+
+def get_events(start: datetime, end: datetime, user_id: int = 1,
+               limit: int | None = None):
+    """
+    Raw events with start <= ts < end, oldest first.
+    Only selects indexed columns, so SQLite answers it
+    from the covering (user_id, ts, ...) index alone.
+    Events still in the buffer are merged in (timestamps as naive UTC,
+    like the rows SQLite returns).
+    """
+    pending = [
+        PendingEvent(_utc(e["ts"]).replace(tzinfo=None), e["album_id"], e["field"], e["value"])
+        for e in _pending_snapshot()
+        if e["user_id"] == user_id and _utc(start) <= _utc(e["ts"]) < _utc(end)
+    ]
+
+    db = SessionLocal()
+    try:
+        query = (
+            db.query(
+                UserAlbumEvent.ts,
+                UserAlbumEvent.album_id,
+                UserAlbumEvent.field,
+                UserAlbumEvent.value,
+            )
+            .filter(
+                UserAlbumEvent.user_id == user_id,
+                UserAlbumEvent.ts >= start,
+                UserAlbumEvent.ts < end,
+            )
+            .order_by(UserAlbumEvent.ts.asc())
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        rows = query.all()
+    finally:
+        db.close()
+
+    if pending:
+        rows = sorted([*rows, *pending], key=lambda row: row.ts)
+        if limit is not None:
+            rows = rows[:limit]
+    return rows
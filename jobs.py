@@ -0,0 +1,546 @@
+"""
+SQLite-backed background job queue, used for metadata enrichment.
+
+    python jobs.py enqueue-missing --provider mymod:fetch   # one job per incomplete album
+    python jobs.py work --workers 4 --provider mymod:fetch  # process jobs until stopped
+    python jobs.py stats
+    python jobs.py bench --jobs 5000                        # throughput with no-op jobs
+
+The provider, fn(album_id) -> metadata dict, fetches what is missing
+(see set_metadata_provider()); workers need it as well as enqueue-missing.
+
+Jobs are leased with a single UPDATE ... RETURNING, so workers never
+grab the same job. A lease expires after the visibility timeout, and an
+unfinished job then becomes visible again. Failures are retried with
+exponential backoff up to max_attempts. Slow preparation (provider
+lookups) runs first with no transaction open; then a handler's writes
+and the job status change are committed together, one short transaction
+per batch (on models.worker_engine, where savepoints nest; see there).
+With the DB in WAL mode the Streamlit UI keeps reading while this runs.
+"""
+
+import argparse
+import importlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from logic import bump_version
+from models import SessionLocal, Album, Job, Review, ReviewRender, engine, init_db, worker_engine
+
+
+BATCH_SIZE = 50
+VISIBILITY_TIMEOUT = timedelta(seconds=60)
+POLL_INTERVAL = 0.5
+
+BACKOFF_BASE = timedelta(seconds=5)
+BACKOFF_MAX = timedelta(hours=1)
+
+WORKER_BACKOFF_MAX = 30.0  # seconds, after "database is locked" and similar
+
+HANDLERS = {}
+PREPARERS = {}
+
+logger = logging.getLogger(__name__)
+
+_jobs = Job.__table__
+
+
+def handler(kind: str, prepare=None):
+    """
+    Register a job handler: fn(db, payload: dict).
+    It runs inside the batch transaction (in a savepoint);
+    raising marks only that job as failed.
+
+    prepare(payload) -> payload, if given, runs first for every job of
+    the batch, outside any transaction. Slow work (network lookups)
+    belongs there, so the write lock is held only while applying.
+    """
+    def register(fn):
+        HANDLERS[kind] = fn
+        if prepare is not None:
+            PREPARERS[kind] = prepare
+        return fn
+    return register
+
+
+# --------------------------------------
+# Producing jobs
+# --------------------------------------
+
+def enqueue_many(jobs: list) -> int:
+    """
+    Insert jobs in one transaction. Each job is a dict with "kind" and
+    optional "payload", "idempotency_key", "max_attempts", "run_after".
+    A key only blocks a new job while its job is queued or running;
+    a finished (done / failed) job with the same key is queued again.
+    Returns how many were actually added or requeued.
+    """
+    if not jobs:
+        return 0
+
+    now = datetime.now(timezone.utc)
+    rows = [
+        {
+            "kind": job["kind"],
+            "payload": json.dumps(job.get("payload") or {}, ensure_ascii=False),
+            "idempotency_key": job.get("idempotency_key"),
+            "max_attempts": job.get("max_attempts", 5),
+            "run_after": job.get("run_after") or now,
+            "status": "queued",
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for job in jobs
+    ]
+
+    stmt = sqlite_insert(_jobs)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["idempotency_key"],
+        set_={
+            **{col: stmt.excluded[col] for col in (
+                "kind", "payload", "max_attempts", "run_after",
+                "status", "attempts", "updated_at",
+            )},
+            "lease_until": None,
+            "leased_by": None,
+            "last_error": None,
+        },
+        # not IN (...): expanding parameters do not work with executemany
+        where=or_(_jobs.c.status == "done", _jobs.c.status == "failed"),
+    )
+    with engine.begin() as conn:
+        result = conn.execute(stmt, rows)
+    return result.rowcount
+
+
+def enqueue(kind: str, payload: dict | None = None,
+            idempotency_key: str | None = None, **options) -> bool:
+    """Add one job; returns False if a job with this key is still queued or running."""
+    job = {"kind": kind, "payload": payload, "idempotency_key": idempotency_key, **options}
+    return enqueue_many([job]) == 1
+
+
+# --------------------------------------
+# Leasing and finishing
+# --------------------------------------
+
+def lease_jobs(worker_id: str, batch_size: int = BATCH_SIZE,
+               visibility_timeout: timedelta = VISIBILITY_TIMEOUT) -> list:
+    """
+    Atomically take up to batch_size runnable jobs: queued ones that are
+    due, plus leased ones whose lease expired. Returns row tuples
+    (id, kind, payload, attempts, max_attempts).
+    """
+    now = datetime.now(timezone.utc)
+
+    runnable = (
+        select(_jobs.c.id)
+        .where(or_(
+            and_(_jobs.c.status == "queued", _jobs.c.run_after <= now),
+            and_(_jobs.c.status == "leased", _jobs.c.lease_until < now),
+        ))
+        .order_by(_jobs.c.run_after)
+        .limit(batch_size)
+    )
+
+    stmt = (
+        update(_jobs)
+        .where(_jobs.c.id.in_(runnable.scalar_subquery()))
+        .values(
+            status="leased",
+            lease_until=now + visibility_timeout,
+            leased_by=worker_id,
+            attempts=_jobs.c.attempts + 1,
+            updated_at=now,
+        )
+        .returning(_jobs.c.id, _jobs.c.kind, _jobs.c.payload,
+                   _jobs.c.attempts, _jobs.c.max_attempts)
+    )
+
+    with worker_engine.begin() as conn:
+        return conn.execute(stmt).all()
+
+
+def backoff_delay(attempts: int) -> timedelta:
+    return min(BACKOFF_BASE * (2 ** max(attempts - 1, 0)), BACKOFF_MAX)
+
+
+def _error_text(exc: Exception) -> str:
+    return f"{type(exc).__name__}: {exc}"
+
+
+def process_batch(worker_id: str, leased: list) -> dict:
+    """
+    Run handlers for leased jobs and record the outcome.
+    Preparation (see handler()) runs first with no transaction open;
+    then handlers and status updates share one short transaction.
+    Returns {"done": n, "retried": n, "failed": n}.
+    """
+    stats = {"done": 0, "retried": 0, "failed": 0}
+    if not leased:
+        return stats
+
+    done_ids = []
+    failures = []
+
+    # 1. no DB lock held: provider lookups may take seconds
+    ready = []
+    for job_id, kind, payload, attempts, max_attempts in leased:
+        try:
+            fn = HANDLERS.get(kind)
+            if fn is None:
+                raise LookupError(f"No handler for job kind: {kind}")
+            payload = json.loads(payload or "{}")
+            prepare = PREPARERS.get(kind)
+            if prepare is not None:
+                payload = prepare(payload)
+            ready.append((job_id, fn, payload, attempts, max_attempts))
+        except Exception as exc:
+            failures.append((job_id, attempts, max_attempts, _error_text(exc)))
+
+    # 2. one short write transaction for the whole batch
+    db = Session(worker_engine, expire_on_commit=False)
+    try:
+        for job_id, fn, payload, attempts, max_attempts in ready:
+            try:
+                with db.begin_nested():
+                    fn(db, payload)
+                done_ids.append(job_id)
+            except Exception as exc:
+                failures.append((job_id, attempts, max_attempts, _error_text(exc)))
+
+        now = datetime.now(timezone.utc)
+        # only touch jobs this worker still owns (lease not taken over)
+        owned = and_(_jobs.c.status == "leased", _jobs.c.leased_by == worker_id)
+
+        if done_ids:
+            db.execute(
+                update(_jobs)
+                .where(owned, _jobs.c.id.in_(done_ids))
+                .values(status="done", lease_until=None, last_error=None, updated_at=now)
+            )
+            stats["done"] = len(done_ids)
+
+        for job_id, attempts, max_attempts, error in failures:
+            if attempts >= max_attempts:
+                values = {"status": "failed"}
+                stats["failed"] += 1
+            else:
+                values = {"status": "queued", "run_after": now + backoff_delay(attempts)}
+                stats["retried"] += 1
+            db.execute(
+                update(_jobs)
+                .where(owned, _jobs.c.id == job_id)
+                .values(lease_until=None, last_error=error, updated_at=now, **values)
+            )
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    return stats
+
+
+# --------------------------------------
+# Worker pool
+# --------------------------------------
+
+def run_workers(num_workers: int = 4, batch_size: int = BATCH_SIZE,
+                stop_when_empty: bool = False, stop_event: threading.Event | None = None,
+                poll_interval: float = POLL_INTERVAL) -> dict:
+    """
+    Run worker threads that lease and process batches.
+    Returns combined stats when they stop (queue empty with
+    stop_when_empty=True, or stop_event set).
+    """
+    stop_event = stop_event or threading.Event()
+    totals = {"done": 0, "retried": 0, "failed": 0}
+    totals_lock = threading.Lock()
+    host = f"{socket.gethostname()}:{os.getpid()}"
+
+    def worker(n):
+        worker_id = f"{host}:{n}"
+        backoff = poll_interval
+        while not stop_event.is_set():
+            try:
+                leased = lease_jobs(worker_id, batch_size)
+                if not leased:
+                    if stop_when_empty:
+                        return
+                    stop_event.wait(poll_interval)
+                    continue
+                stats = process_batch(worker_id, leased)
+            except OperationalError as exc:
+                # e.g. "database is locked": leased jobs come back when
+                # their lease expires; wait and try again
+                logger.warning("%s: %s; retrying in %.1fs", worker_id, exc, backoff)
+                stop_event.wait(backoff)
+                backoff = min(backoff * 2, WORKER_BACKOFF_MAX)
+                continue
+            backoff = poll_interval
+            with totals_lock:
+                for key, value in stats.items():
+                    totals[key] += value
+
+    threads = [
+        threading.Thread(target=worker, args=(n,), name=f"job-worker-{n}", daemon=True)
+        for n in range(num_workers)
+    ]
+    for t in threads:
+        t.start()
+    try:
+        for t in threads:
+            while t.is_alive():
+                t.join(0.5)
+    except KeyboardInterrupt:
+        stop_event.set()
+        for t in threads:
+            t.join()
+
+    return totals
+
+
+def get_queue_stats() -> dict:
+    """Counts per status, e.g. {"queued": 10, "leased": 2, "done": 900, "failed": 1}."""
+    db = SessionLocal()
+    try:
+        rows = db.query(Job.status, func.count(Job.id)).group_by(Job.status).all()
+    finally:
+        db.close()
+
+    stats = dict.fromkeys(("queued", "leased", "done", "failed"), 0)
+    stats.update(dict(rows))
+    return stats
+
+
+def get_recent_failures(limit: int = 5) -> list:
+    db = SessionLocal()
+    try:
+        return (
+            db.query(Job)
+            .filter(Job.status == "failed")
+            .order_by(Job.updated_at.desc())
+            .limit(limit)
+            .all()
+        )
+    finally:
+        db.close()
+
+
+# --------------------------------------
+# Enrichment: album metadata
+# --------------------------------------
+
+ALBUM_FIELDS = ("cover_url", "genre")
+REVIEW_FIELDS = ("rating", "published_at")
+
+_metadata_provider = None
+
+
+def set_metadata_provider(fn):
+    """
+    fn(album_id) -> {"cover_url": .., "genre": ..,
+                     "reviews": [{"review_id": .., "rating": .., "published_at": ..}]}
+    Used for album_metadata jobs enqueued without ready-made data.
+    """
+    global _metadata_provider
+    _metadata_provider = fn
+
+
+def fetch_album_metadata(payload: dict) -> dict:
+    """
+    Prepare step of album_metadata jobs: ask the provider for data,
+    outside any transaction, unless the job carries ready-made data.
+    """
+    if payload.get("data") is not None:
+        return payload
+    if _metadata_provider is None:
+        raise RuntimeError("No metadata provider registered")
+    return {**payload, "data": _metadata_provider(payload["album_id"]) or {}}
+
+
+@handler("album_metadata", prepare=fetch_album_metadata)
+def apply_album_metadata(db, payload: dict):
+    """
+    Fill empty Album.cover_url / genre and Review.rating / published_at
+    from payload["data"] (see fetch_album_metadata()).
+    Existing values are kept unless payload["overwrite"] is true,
+    so running the same job twice changes nothing.
+    """
+    album_id = payload["album_id"]
+    data = payload.get("data") or {}
+
+    overwrite = payload.get("overwrite", False)
+    changed = False
+
+    album = db.get(Album, album_id)
+    if album is None:
+        raise LookupError(f"Album {album_id} not found")
+
+    for field in ALBUM_FIELDS:
+        value = data.get(field)
+        if value is not None and (overwrite or getattr(album, field) is None):
+            setattr(album, field, value)
+            changed = True
+
+    touched_reviews = []
+    for item in data.get("reviews", []):
+        review = db.get(Review, item["review_id"])
+        if review is None or review.album_id != album_id:
+            continue
+        for field in REVIEW_FIELDS:
+            value = item.get(field)
+            if field == "published_at" and isinstance(value, str):
+                value = datetime.fromisoformat(value)
+            if value is not None and (overwrite or getattr(review, field) is None):
+                setattr(review, field, value)
+                touched_reviews.append(review.id)
+                changed = True
+
+    if touched_reviews:
+        # meta line changed: drop renders, they are rebuilt on next view
+        db.query(ReviewRender).filter(
+            ReviewRender.review_id.in_(touched_reviews)
+        ).delete(synchronize_session=False)
+
+    if changed:
+        bump_version(db, "catalog")
+
+
+def load_metadata_provider(spec: str):
+    """Register a provider given as "module:function"."""
+    module_name, _, attr = spec.partition(":")
+    if not module_name or not attr:
+        raise ValueError(f"Provider must look like module:function, got {spec!r}")
+    set_metadata_provider(getattr(importlib.import_module(module_name), attr))
+
+
+def enqueue_missing_metadata() -> int:
+    """
+    One album_metadata job per album with something still missing.
+    Refuses without a provider: those jobs could only fail.
+    """
+    if _metadata_provider is None:
+        raise RuntimeError(
+            "No metadata provider registered; "
+            "call set_metadata_provider() or pass --provider module:function"
+        )
+
+    db = SessionLocal()
+    try:
+        missing_reviews = (
+            select(Review.album_id)
+            .where(or_(Review.rating.is_(None), Review.published_at.is_(None)))
+        )
+        album_ids = [
+            row.id for row in
+            db.query(Album.id).filter(or_(
+                Album.cover_url.is_(None),
+                Album.genre.is_(None),
+                Album.id.in_(missing_reviews),
+            ))
+        ]
+    finally:
+        db.close()
+
+    return enqueue_many([
+        {
+            "kind": "album_metadata",
+            "payload": {"album_id": album_id},
+            "idempotency_key": f"album_metadata:{album_id}",
+        }
+        for album_id in album_ids
+    ])
+
+
+# --------------------------------------
+# Benchmark
+# --------------------------------------
+
+@handler("noop")
+def _noop(db, payload: dict):
+    pass
+
+
+def bench(num_jobs: int, num_workers: int, batch_size: int) -> dict:
+    run_id = f"bench-{os.getpid()}-{time.time_ns()}"
+    started = time.perf_counter()
+    enqueue_many([
+        {"kind": "noop", "payload": {"n": i}, "idempotency_key": f"{run_id}:{i}"}
+        for i in range(num_jobs)
+    ])
+    enqueued = time.perf_counter()
+
+    totals = run_workers(num_workers, batch_size, stop_when_empty=True)
+    finished = time.perf_counter()
+
+    # leave the real queue as it was
+    with engine.begin() as conn:
+        conn.execute(_jobs.delete().where(_jobs.c.idempotency_key.like(f"{run_id}:%")))
+
+    return {
+        "jobs": totals["done"],
+        "enqueue_seconds": enqueued - started,
+        "process_seconds": finished - enqueued,
+        "jobs_per_minute": totals["done"] / (finished - enqueued) * 60,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Background job queue.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    work = sub.add_parser("work", help="process jobs until Ctrl+C")
+    work.add_argument("--workers", type=int, default=4)
+    work.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    missing = sub.add_parser("enqueue-missing", help="queue metadata jobs for incomplete albums")
+    for p in (work, missing):
+        p.add_argument("--provider", metavar="MODULE:FUNCTION",
+                       help="metadata provider for album_metadata jobs")
+    sub.add_parser("stats", help="job counts per status")
+
+    b = sub.add_parser("bench", help="measure queue throughput with no-op jobs")
+    b.add_argument("--jobs", type=int, default=5000)
+    b.add_argument("--workers", type=int, default=4)
+    b.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    args = parser.parse_args(argv)
+    init_db()
+    if getattr(args, "provider", None):
+        load_metadata_provider(args.provider)
+
+    if args.command == "work":
+        totals = run_workers(args.workers, args.batch_size)
+        print(", ".join(f"{k}: {v}" for k, v in totals.items()))
+    elif args.command == "enqueue-missing":
+        try:
+            print(f"jobs added: {enqueue_missing_metadata()}")
+        except RuntimeError as exc:
+            parser.exit(1, f"{exc}\n")
+    elif args.command == "stats":
+        print(", ".join(f"{k}: {v}" for k, v in get_queue_stats().items()))
+    else:
+        result = bench(args.jobs, args.workers, args.batch_size)
+        print(f"jobs:       {result['jobs']}")
+        print(f"enqueue:    {result['enqueue_seconds']:.2f} s")
+        print(f"processing: {result['process_seconds']:.2f} s")
+        print(f"throughput: {result['jobs_per_minute']:.0f} jobs/min")
+
+
+if __name__ == "__main__":
+    main()
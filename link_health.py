@@ -0,0 +1,297 @@
+"""
+Link health for album_links (YouTube / Bandcamp / Spotify ...).
+
+Links are checked concurrently with aiohttp: one connection pool with a
+per-host limit, a global concurrency cap, HEAD first and GET when the
+server does not like HEAD, and a timeout per request. Results go to
+album_link_health and a link is only checked again once its TTL expired.
+
+    python link_health.py              # check every link that is due
+    python link_health.py --standin    # demo against a local fake server
+"""
+
+import argparse
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+
+import aiohttp
+from sqlalchemy import or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import SessionLocal, AlbumLink, AlbumLinkHealth, init_db
+
+
+# Alive links are trusted for a week, broken ones are retried sooner
+OK_TTL = timedelta(days=7)
+FAILED_TTL = timedelta(days=1)
+
+CONCURRENCY = 20
+PER_HOST_LIMIT = 4
+TIMEOUT_SECONDS = 10.0
+
+# Statuses that often mean "HEAD not supported" rather than "dead"
+HEAD_FALLBACK_STATUSES = {403, 405, 501}
+
+USER_AGENT = "UndeadArchive-LinkCheck/1.0"
+
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+
+# --------------------------------------
+# Checking
+# --------------------------------------
+
+async def check_url(session, url: str) -> dict:
+    """
+    Check one URL. Returns status_code, ok, final_url and error.
+    Never raises for network problems; they end up in "error".
+    """
+    try:
+        async with session.head(url, allow_redirects=True) as resp:
+            status, final_url = resp.status, str(resp.url)
+
+        if status in HEAD_FALLBACK_STATUSES:
+            # body is not needed, only the status line and redirects
+            async with session.get(url, allow_redirects=True) as resp:
+                status, final_url = resp.status, str(resp.url)
+
+        return {
+            "status_code": status,
+            "ok": 1 if status < 400 else 0,
+            "final_url": final_url,
+            "error": None,
+        }
+    except asyncio.TimeoutError:
+        error = "timeout"
+    except aiohttp.ClientError as exc:
+        error = f"{type(exc).__name__}: {exc}"
+
+    return {"status_code": None, "ok": 0, "final_url": None, "error": error}
+
+
+async def check_links(links: list, concurrency: int = CONCURRENCY,
+                      per_host: int = PER_HOST_LIMIT,
+                      timeout: float = TIMEOUT_SECONDS) -> list:
+    """
+    Check (link_id, url) pairs concurrently.
+    Returns result dicts with link_id, url_checked and checked_at added.
+    """
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with aiohttp.ClientSession(
+        connector=connector,
+        timeout=client_timeout,
+        headers={"User-Agent": USER_AGENT},
+    ) as session:
+
+        async def one(link_id, url):
+            async with semaphore:
+                result = await check_url(session, url)
+            result.update(
+                link_id=link_id,
+                url_checked=url,
+                checked_at=datetime.now(timezone.utc),
+            )
+            return result
+
+        return await asyncio.gather(*[one(link_id, url) for link_id, url in links])
+
+
+# --------------------------------------
+# Storage
+# --------------------------------------
+
+def get_links_due(album_id: int | None = None, now: datetime | None = None) -> list:
+    """
+    (link_id, url) pairs never checked, changed since the last check,
+    or whose TTL has expired.
+    """
+    now = now or datetime.now(timezone.utc)
+
+    db = SessionLocal()
+    try:
+        query = (
+            db.query(AlbumLink.id, AlbumLink.url)
+            .outerjoin(AlbumLinkHealth, AlbumLinkHealth.link_id == AlbumLink.id)
+            .filter(or_(
+                AlbumLinkHealth.link_id.is_(None),
+                AlbumLinkHealth.url_checked != AlbumLink.url,
+                (AlbumLinkHealth.ok == 1) & (AlbumLinkHealth.checked_at < now - OK_TTL),
+                (AlbumLinkHealth.ok == 0) & (AlbumLinkHealth.checked_at < now - FAILED_TTL),
+            ))
+        )
+        if album_id is not None:
+            query = query.filter(AlbumLink.album_id == album_id)
+        return query.all()
+    finally:
+        db.close()
+
+
+def save_results(results: list):
+    if not results:
+        return
+
+    columns = ("url_checked", "status_code", "ok", "final_url", "error", "checked_at")
+    stmt = sqlite_insert(AlbumLinkHealth.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["link_id"],
+        set_={col: stmt.excluded[col] for col in columns},
+    )
+
+    db = SessionLocal()
+    try:
+        db.execute(stmt, [
+            {"link_id": r["link_id"], **{col: r[col] for col in columns}}
+            for r in results
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def get_link_health(album_id: int) -> dict:
+    """link_id -> AlbumLinkHealth for the album's checked links."""
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(AlbumLinkHealth)
+            .join(AlbumLink, AlbumLink.id == AlbumLinkHealth.link_id)
+            .filter(AlbumLink.album_id == album_id)
+            .all()
+        )
+        return {row.link_id: row for row in rows}
+    finally:
+        db.close()
+
+
+def refresh_link_health(album_id: int | None = None, **check_options) -> int:
+    """
+    Check every due link (of one album, or all) and store the results.
+    Blocking; returns how many links were checked.
+    """
+    links = get_links_due(album_id)
+    if not links:
+        return 0
+    results = asyncio.run(check_links(links, **check_options))
+    save_results(results)
+    return len(results)
+
+
+def refresh_in_background(album_id: int) -> bool:
+    """
+    Start a daemon thread that refreshes this album's due links,
+    so the UI can render stored statuses right away.
+    Returns False if a refresh for the album is already running.
+    """
+    with _in_flight_lock:
+        if album_id in _in_flight:
+            return False
+        _in_flight.add(album_id)
+
+    def run():
+        try:
+            refresh_link_health(album_id)
+        finally:
+            with _in_flight_lock:
+                _in_flight.discard(album_id)
+
+    threading.Thread(target=run, name=f"link-health-{album_id}", daemon=True).start()
+    return True
+
+
+# --------------------------------------
+# Local stand-in server (for trying the checker offline)
+# --------------------------------------
+
+def make_standin_app(slow_seconds: float = 5.0):
+    """
+    aiohttp app that imitates real link hosts:
+    /ok, /slow, /redirect (-> /ok), /redirect-dead (-> /dead),
+    /dead (404), /gone (410), /no-head (405 on HEAD, 200 on GET), /error (500).
+    """
+    from aiohttp import web
+
+    async def ok(request):
+        return web.Response(text="ok")
+
+    async def slow(request):
+        await asyncio.sleep(slow_seconds)
+        return web.Response(text="finally")
+
+    async def redirect(request):
+        raise web.HTTPFound("/ok")
+
+    async def redirect_dead(request):
+        raise web.HTTPMovedPermanently("/dead")
+
+    async def dead(request):
+        raise web.HTTPNotFound()
+
+    async def gone(request):
+        raise web.HTTPGone()
+
+    async def no_head(request):
+        if request.method == "HEAD":
+            raise web.HTTPMethodNotAllowed("HEAD", ["GET"])
+        return web.Response(text="get only")
+
+    async def error(request):
+        raise web.HTTPInternalServerError()
+
+    app = web.Application()
+    for path, handler in [
+        ("/ok", ok), ("/slow", slow), ("/redirect", redirect),
+        ("/redirect-dead", redirect_dead), ("/dead", dead), ("/gone", gone),
+        ("/no-head", no_head), ("/error", error),
+    ]:
+        # add_get also registers HEAD
+        app.router.add_get(path, handler)
+    return app
+
+
+async def run_standin_demo(timeout: float = 1.0):
+    from aiohttp import web
+
+    runner = web.AppRunner(make_standin_app(slow_seconds=timeout * 3))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+
+    paths = ["/ok", "/slow", "/redirect", "/redirect-dead", "/dead",
+             "/gone", "/no-head", "/error", "/missing"]
+    links = [(i, f"http://127.0.0.1:{port}{p}") for i, p in enumerate(paths)]
+    try:
+        results = await check_links(links, timeout=timeout)
+    finally:
+        # unreachable host: nothing listens on the freed port
+        await runner.cleanup()
+    results += await check_links([(len(links), f"http://127.0.0.1:{port}/ok")], timeout=timeout)
+
+    for r in results:
+        state = "alive" if r["ok"] else "DEAD"
+        detail = r["error"] or f"{r['status_code']} -> {r['final_url']}"
+        print(f"{state:5}  {r['url_checked']:40}  {detail}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check album links.")
+    parser.add_argument("--album", type=int, help="only this album's links")
+    parser.add_argument("--standin", action="store_true",
+                        help="check a local fake server instead of the DB links")
+    args = parser.parse_args(argv)
+
+    if args.standin:
+        asyncio.run(run_standin_demo())
+        return
+
+    init_db()
+    print(f"links checked: {refresh_link_health(args.album)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Process-wide caches for the Streamlit UI, kept fresh by the change feed.
+
+Album states, scope lists and the last album are read from here instead
+of the DB on every rerun. A "flags" event for album X drops X's state
+and re-checks X's membership in each cached scope list, which means one
+single-row query per list, not a full catalog query. "last_album" only
+drops the cached last album. "full" events, and changes made by other
+processes (noticed by a throttled version check), clear everything.
+"""
+
+import bisect
+import threading
+import time
+
+from changes import change_feed
+from logic import (
+    get_albums_for_scope,
+    get_data_versions,
+    get_last_album,
+    get_scope_entry,
+    get_user_album_state,
+)
+
+
+# How often (at most) to look at data_versions for other processes' writes
+DB_CHECK_INTERVAL = 10.0
+
+
+def _sort_key(album, sort_name):
+    """Same order as get_albums_for_scope(): NULL names first, NULL years last."""
+    return (
+        sort_name is not None, sort_name or "",
+        album.title is not None, album.title or "",
+        album.year is None, album.year or 0,
+        album.id,
+    )
+
+
+class _ScopeList:
+    def __init__(self, rows):
+        self.keys = [_sort_key(album, name) for album, name in rows]
+        order = sorted(range(len(rows)), key=self.keys.__getitem__)
+        self.keys = [self.keys[i] for i in order]
+        self.albums = [rows[i][0] for i in order]
+        self.ids = {album.id for album in self.albums}
+
+    def remove(self, album_id):
+        for i, album in enumerate(self.albums):
+            if album.id == album_id:
+                del self.albums[i]
+                del self.keys[i]
+                break
+        self.ids.discard(album_id)
+
+    def insert(self, album, sort_name):
+        key = _sort_key(album, sort_name)
+        i = bisect.bisect_left(self.keys, key)
+        self.keys.insert(i, key)
+        self.albums.insert(i, album)
+        self.ids.add(album.id)
+
+
+class LiveState:
+    def __init__(self, feed=change_feed):
+        self.feed = feed
+        self._lock = threading.Lock()
+        self._states = {}
+        self._scopes = {}
+        self._last_album = None
+        self._last_album_loaded = False
+        self._catalog_version = None
+        self._last_db_check = 0.0
+        feed.subscribe(self._on_change)
+
+    # --------------------------------------
+    # Reads
+    # --------------------------------------
+
+    def get_user_album_state(self, album_id: int) -> dict:
+        with self._lock:
+            state = self._states.get(album_id)
+        if state is None:
+            seq = self.feed.seq
+            state = get_user_album_state(album_id)
+            with self._lock:
+                # a change published meanwhile may not be in what we read
+                if self.feed.seq == seq:
+                    self._states[album_id] = state
+        return dict(state)
+
+    def get_albums_for_scope(self, scope: str = "all",
+                             only_favorites: bool = False,
+                             only_wishlist: bool = False) -> list:
+        key = (scope, bool(only_favorites), bool(only_wishlist))
+        with self._lock:
+            cached = self._scopes.get(key)
+            if cached is not None:
+                return list(cached.albums)
+
+        seq = self.feed.seq
+        rows = get_albums_for_scope(*key, with_sort_names=True)
+        scope_list = _ScopeList(rows)
+        with self._lock:
+            if self.feed.seq == seq:
+                self._scopes[key] = scope_list
+        return list(scope_list.albums)
+
+    def get_last_album(self):
+        with self._lock:
+            if self._last_album_loaded:
+                return self._last_album
+        seq = self.feed.seq
+        album = get_last_album()
+        with self._lock:
+            if self.feed.seq == seq:
+                self._last_album = album
+                self._last_album_loaded = True
+        return album
+
+    # --------------------------------------
+    # Invalidation
+    # --------------------------------------
+
+    def _on_change(self, event):
+        if event.kind == "last_album":
+            with self._lock:
+                self._last_album_loaded = False
+            return
+
+        if event.kind != "flags" or event.album_id is None:
+            self.clear()
+            return
+
+        album_id = event.album_id
+        with self._lock:
+            self._states.pop(album_id, None)
+            # "all" without filters does not depend on flags
+            keys = [k for k in self._scopes if k != ("all", False, False)]
+
+        for key in keys:
+            entry = get_scope_entry(album_id, *key)
+            with self._lock:
+                scope_list = self._scopes.get(key)
+                if scope_list is None:
+                    continue
+                if entry is None and album_id in scope_list.ids:
+                    scope_list.remove(album_id)
+                elif entry is not None and album_id not in scope_list.ids:
+                    scope_list.insert(*entry)
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+            self._scopes.clear()
+            self._last_album_loaded = False
+
+    def sync_with_db(self, force: bool = False):
+        """
+        Pick up writes from other processes (API server, sync import,
+        enrichment jobs). Reads data_versions at most every
+        DB_CHECK_INTERVAL seconds.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_db_check < DB_CHECK_INTERVAL:
+            return
+        self._last_db_check = now
+
+        versions = get_data_versions()
+        if self._catalog_version is not None and versions["catalog"] != self._catalog_version:
+            self.clear()
+        self._catalog_version = versions["catalog"]
+        self.feed.sync_with_db(versions["user_state"])
+
+
+# One instance per process, shared by all sessions
+live_state = LiveState()
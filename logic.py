@@ -1,7 +1,10 @@
 import random
-from models import Artist, SessionLocal, UserAlbum, UserSettings,  Album, AlbumLink, Review
-from sqlalchemy.orm import joinedload  
-from sqlalchemy import and_
+from models import Artist, SessionLocal, UserAlbum, UserSettings,  Album, AlbumLink, Review, DataVersion, ArtistAlias
+from sqlalchemy.orm import joinedload, aliased
+from sqlalchemy import and_, func, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from history import record_event
+from changes import change_feed
 
 
 
@@ -36,6 +39,43 @@ def get_or_create_user_album(db, album_id: int):
     return ua
 
 
+# --------------------------------------
+# Data versions (catalog / user_state)
+# --------------------------------------
+
+def bump_version(db, name: str) -> int:
+    """
+    Increment a data version inside the caller's transaction,
+    so the version moves together with the change itself.
+    Returns the new version.
+    """
+    stmt = sqlite_insert(DataVersion.__table__).values(name=name, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"version": DataVersion.__table__.c.version + 1},
+    )
+    stmt = stmt.returning(DataVersion.__table__.c.version)
+    return db.execute(stmt).scalar_one()
+
+
+def get_data_versions():
+    """
+    Return {"catalog": int, "user_state": int, "user_flags": int};
+    0 if never bumped. user_state moves on every user-state write,
+    user_flags only when listened / favorite / wishlist change
+    (not on set_last_album), for consumers of the flags alone.
+    """
+    db = SessionLocal()
+    try:
+        rows = db.query(DataVersion.name, DataVersion.version).all()
+    finally:
+        db.close()
+
+    versions = {"catalog": 0, "user_state": 0, "user_flags": 0}
+    versions.update({name: version for name, version in rows})
+    return versions
+
+
 # --------------------------------------
 # Toggle functions (simple and intuitive)
 # --------------------------------------
@@ -48,10 +88,15 @@ def toggle_listened(album_id: int):
     # flip 0 to 1 or 1 to 0
     new_value = 1 if ua.listened == 0 else 0
     ua.listened = new_value
+    version = bump_version(db, "user_state")
+    bump_version(db, "user_flags")
 
     db.commit()
     db.close()
 
+    record_event(album_id, "listened", new_value)
+    change_feed.publish("flags", album_id, version)
+
     return new_value
 
 
@@ -61,9 +106,14 @@ def toggle_favorite(album_id: int):
 
     new_value = 1 if ua.favorite == 0 else 0
     ua.favorite = new_value
+    version = bump_version(db, "user_state")
+    bump_version(db, "user_flags")
 
     db.commit()
     db.close()
+
+    record_event(album_id, "favorite", new_value)
+    change_feed.publish("flags", album_id, version)
     return new_value
 
 
@@ -73,13 +123,59 @@ def toggle_wishlist(album_id: int):
 
     new_value = 1 if ua.wishlist == 0 else 0
     ua.wishlist = new_value
+    version = bump_version(db, "user_state")
+    bump_version(db, "user_flags")
 
     db.commit()
     db.close()
+
+    record_event(album_id, "wishlist", new_value)
+    change_feed.publish("flags", album_id, version)
     return new_value
 
 
 
+def set_user_album_flags(album_id: int, **flags):
+    """
+    Set flags to explicit values, e.g. set_user_album_flags(5, listened=1).
+    Unlike the toggles this is idempotent, which suits API clients.
+    Returns the resulting state.
+    """
+    unknown = set(flags) - {"listened", "favorite", "wishlist"}
+    if unknown:
+        raise ValueError(f"Unknown flags: {', '.join(sorted(unknown))}")
+
+    db = SessionLocal()
+    ua = get_or_create_user_album(db, album_id)
+
+    changed = {}
+    for field, value in flags.items():
+        value = 1 if value else 0
+        if (getattr(ua, field) or 0) != value:
+            setattr(ua, field, value)
+            changed[field] = value
+
+    version = None
+    if changed:
+        version = bump_version(db, "user_state")
+        bump_version(db, "user_flags")
+        db.commit()
+
+    state = {
+        "listened": ua.listened or 0,
+        "favorite": ua.favorite or 0,
+        "wishlist": ua.wishlist or 0,
+    }
+    db.close()
+
+    for field, value in changed.items():
+        record_event(album_id, field, value)
+    if changed:
+        change_feed.publish("flags", album_id, version)
+
+    return state
+
+
 def get_user_album_state(album_id: int):
     """
     Read-only view of user state for a given album.
@@ -122,12 +218,19 @@ def set_last_album(album_id: int):
             random_mode_enabled=1
         )
         db.add(settings)
+    elif settings.last_album_id == album_id:
+        # called on every rerun: no write, no version bump if unchanged
+        db.close()
+        return
     else:
         settings.last_album_id = album_id
 
+    version = bump_version(db, "user_state")
     db.commit()
     db.close()
 
+    change_feed.publish("last_album", album_id, version)
+
 
 def get_random_album(scope: str = "all",
                      only_favorites: bool = False,
@@ -255,6 +358,7 @@ def add_album_link(album_id: int, source: str, url: str):
     )
 
     db.add(link)
+    bump_version(db, "catalog")
     db.commit()
     db.close()
 
@@ -297,10 +401,12 @@ def get_last_album():
 
 def get_albums_for_scope(scope: str = "all",
                          only_favorites: bool = False,
-                         only_wishlist: bool = False):
+                         only_wishlist: bool = False,
+                         with_sort_names: bool = False):
     """
     Return list of albums for given scope and filters,
     sorted by Artist name + Album title, with artist eagerly loaded.
+    with_sort_names=True returns (album, sort_name) pairs instead.
     """
     db = SessionLocal()
     try:
@@ -312,22 +418,123 @@ def get_albums_for_scope(scope: str = "all",
             .join(Artist, Album.artist_id == Artist.id)
             .options(joinedload(Album.artist))
         )
+        query, sort_name = join_canonical_artist(query)
+
+        if with_sort_names:
+            query = query.add_columns(sort_name)
 
         albums = (
             query
             .order_by(
-                Artist.name.asc(),
+                sort_name.asc(),
                 Album.title.asc(),
                 Album.year.asc().nulls_last()  # pure tiebreaker
             )
             .all()
         )
 
+        if with_sort_names:
+            return [tuple(row) for row in albums]
         return albums
     finally:
         db.close()
 
 
+def get_albums_page(scope: str = "all",
+                    only_favorites: bool = False,
+                    only_wishlist: bool = False,
+                    after: tuple | None = None,
+                    limit: int = 50):
+    """
+    One page of albums for the given scope and filters,
+    ordered by (Artist name, Album title, Album id).
+    `after` is the sort key of the last album on the previous page
+    (keyset pagination: no OFFSET, every page costs the same).
+    Returns (albums, next_after) where next_after is None on the last page.
+    """
+    db = SessionLocal()
+    try:
+        query = build_album_query(db, scope, only_favorites, only_wishlist)
+
+        query = (
+            query
+            .join(Artist, Album.artist_id == Artist.id)
+            .options(joinedload(Album.artist))
+        )
+        query, sort_name = join_canonical_artist(query)
+
+        artist_name = func.coalesce(sort_name, "")
+        album_title = func.coalesce(Album.title, "")
+
+        if after is not None:
+            query = query.filter(
+                tuple_(artist_name, album_title, Album.id) > tuple_(*after)
+            )
+
+        rows = (
+            query
+            .add_columns(artist_name)
+            .order_by(artist_name.asc(), album_title.asc(), Album.id.asc())
+            .limit(limit + 1)
+            .all()
+        )
+    finally:
+        db.close()
+
+    albums = [album for album, _ in rows]
+    if len(albums) <= limit:
+        return albums, None
+
+    albums = albums[:limit]
+    last, last_name = rows[limit - 1]
+    next_after = (last_name, last.title or "", last.id)
+    return albums, next_after
+
+
+def get_scope_entry(album_id: int,
+                    scope: str = "all",
+                    only_favorites: bool = False,
+                    only_wishlist: bool = False):
+    """
+    (album, sort_name) if the album belongs to the scope + filters,
+    else None. Lets caches update one album of a scope list instead
+    of re-running get_albums_for_scope().
+    """
+    db = SessionLocal()
+    try:
+        query = build_album_query(db, scope, only_favorites, only_wishlist)
+        query = (
+            query
+            .join(Artist, Album.artist_id == Artist.id)
+            .options(joinedload(Album.artist))
+        )
+        query, sort_name = join_canonical_artist(query)
+
+        return (
+            query
+            .add_columns(sort_name)
+            .filter(Album.id == album_id)
+            .first()
+        )
+    finally:
+        db.close()
+
+
+def join_canonical_artist(query):
+    """
+    Outer-join artist_aliases so variants and collaborations sort and
+    group under their canonical artist (see artist_resolution.py).
+    The query must already join Artist. Returns (query, sort_name).
+    """
+    canonical = aliased(Artist)
+    query = (
+        query
+        .outerjoin(ArtistAlias, ArtistAlias.artist_id == Artist.id)
+        .outerjoin(canonical, canonical.id == ArtistAlias.canonical_artist_id)
+    )
+    return query, func.coalesce(canonical.name, Artist.name)
+
+
 def build_album_query(db, scope: str,
                       only_favorites: bool = False,
                       only_wishlist: bool = False):
@@ -1,6 +1,7 @@
 from sqlalchemy import (
     create_engine, Column, Integer, String, Text,
-    ForeignKey, DateTime, UniqueConstraint
+    ForeignKey, DateTime, Date, Float, UniqueConstraint, Index,
+    inspect, text, event
 )
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
 from datetime import datetime, timezone
@@ -9,6 +10,41 @@ from datetime import datetime, timezone
 DATABASE_URL = "sqlite:///goth_reviews.db"
 
 engine = create_engine(DATABASE_URL, echo=False)
+
+
+@event.listens_for(engine, "connect")
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL: readers (the UI) never wait for a writer (background jobs);
+    # busy_timeout: writers wait their turn instead of failing at once
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+# Background writers (jobs.py workers, history.py flushes) get their
+# own engine. pysqlite only
+# emits BEGIN right before an INSERT/UPDATE/DELETE, so a SAVEPOINT
+# issued first opens the transaction and its RELEASE commits it.
+# Here the driver leaves transactions alone and SQLAlchemy's "begin"
+# emits BEGIN IMMEDIATE (these transactions always write, and take the
+# write lock before reading what they base their writes on), so
+# savepoints really nest inside the batch transaction.
+worker_engine = create_engine(DATABASE_URL, echo=False)
+event.listen(worker_engine, "connect", _sqlite_pragmas)
+
+
+@event.listens_for(worker_engine, "connect")
+def _worker_no_driver_transactions(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+
+@event.listens_for(worker_engine, "begin")
+def _worker_begin(conn):
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
 SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
 
 
@@ -26,6 +62,48 @@ class Artist(Base):
     albums = relationship("Album", back_populates="artist")
 
 
+# ------------------------------
+# ARTIST ALIASES (entity resolution)
+# ------------------------------
+
+class ArtistAlias(Base):
+    """
+    Points a duplicate / variant artist at its canonical artist.
+    Artists without a row here are canonical themselves.
+    Filled by artist_resolution.py.
+    """
+    __tablename__ = "artist_aliases"
+
+    artist_id = Column(Integer, ForeignKey("artists.id"), primary_key=True)
+    canonical_artist_id = Column(Integer, ForeignKey("artists.id"), nullable=False, index=True)
+
+    # "variant" (same artist, spelled differently) / "collab" (A / B)
+    kind = Column(String(20), nullable=False, default="variant")
+
+    # Similarity score that produced the match (1.0 = exact key match)
+    score = Column(Float, nullable=True)
+
+    created_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+    )
+
+
+class ArtistBlockKey(Base):
+    """
+    Blocking keys per artist: only artists sharing a key are compared.
+    An artist with no keys yet has not been through resolution.
+    """
+    __tablename__ = "artist_block_keys"
+
+    artist_id = Column(Integer, ForeignKey("artists.id"), primary_key=True)
+    key = Column(String, primary_key=True)
+
+    __table_args__ = (
+        Index("ix_artist_block_keys_key", "key"),
+    )
+
+
 class Album(Base):
     __tablename__ = "albums"
 
@@ -59,6 +137,32 @@ class Review(Base):
     album = relationship("Album", back_populates="reviews")
 
 
+# ------------------------------
+# PRE-RENDERED REVIEWS
+# ------------------------------
+
+class ReviewRender(Base):
+    """
+    Render-ready form of a review, built once at import / migration time
+    (see review_render.py) instead of on every Streamlit rerun.
+    """
+    __tablename__ = "review_renders"
+
+    review_id = Column(Integer, ForeignKey("reviews.id"), primary_key=True)
+
+    # sha1 of text + author + date + rating; rebuilt when it changes
+    content_hash = Column(String(40), nullable=False)
+
+    # "Author: X | Published: 2001-05-01 | Rating: 4/5 ★★★★☆"
+    meta_line = Column(Text, nullable=True)
+
+    # JSON list of [start, end] offsets into the normalised text
+    paragraph_offsets = Column(Text, nullable=False)
+
+    # Whole review as one escaped HTML block
+    html = Column(Text, nullable=False)
+
+
 # ------------------------------
 # USER-ALBUM RELATIONSHIP TABLE
 # ------------------------------
@@ -103,6 +207,61 @@ class UserAlbum(Base):
         UniqueConstraint("user_id", "album_id", name="uq_user_album"),
     )
 
+# ------------------------------
+# USER-ALBUM EVENT LOG (append-only)
+# ------------------------------
+
+class UserAlbumEvent(Base):
+    __tablename__ = "user_album_events"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False, default=1)
+    album_id = Column(Integer, ForeignKey("albums.id"), nullable=False)
+
+    # Which flag changed: listened / favorite / wishlist
+    field = Column(String(20), nullable=False)
+
+    # New value of the flag after the toggle (0 or 1)
+    value = Column(Integer, nullable=False)
+
+    # When the toggle happened (UTC)
+    ts = Column(DateTime(timezone=True), nullable=False)
+
+    # Covering index: range queries on (user_id, ts) never touch the table
+    __table_args__ = (
+        Index(
+            "ix_user_album_events_user_ts",
+            "user_id", "ts", "album_id", "field", "value",
+        ),
+    )
+
+
+# ------------------------------
+# USER-ALBUM ROLLUPS (per day / week / month)
+# ------------------------------
+
+class UserAlbumRollup(Base):
+    __tablename__ = "user_album_rollups"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False, default=1)
+
+    # "day" / "week" / "month"
+    period = Column(String(10), nullable=False)
+
+    # First day of the bucket (week starts on Monday)
+    period_start = Column(Date, nullable=False)
+
+    # How many times each flag was switched ON inside the bucket
+    listened = Column(Integer, nullable=False, default=0)
+    favorite = Column(Integer, nullable=False, default=0)
+    wishlist = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "period", "period_start", name="uq_user_rollup"),
+    )
+
+
 # -------------------------
 # ALBUM LINKS TABLE
 # -------------------------
@@ -121,9 +280,45 @@ class AlbumLink(Base):
     # The actual link
     url = Column(Text, nullable=False)
 
+    # Last change, used by sync to merge last-writer-wins
+    updated_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+        nullable=True,
+    )
+
     # Relationship back to Album
     album = relationship("Album", back_populates="links")
 
+# -------------------------
+# ALBUM LINK HEALTH
+# -------------------------
+
+class AlbumLinkHealth(Base):
+    """
+    Result of the last check of an AlbumLink (see link_health.py).
+    """
+    __tablename__ = "album_link_health"
+
+    link_id = Column(Integer, ForeignKey("album_links.id"), primary_key=True)
+
+    # The URL that was checked; a changed link is re-checked right away
+    url_checked = Column(Text, nullable=False)
+
+    # HTTP status of the final response (None if it never answered)
+    status_code = Column(Integer, nullable=True)
+    ok = Column(Integer, nullable=False, default=0)  # 1 = alive
+
+    # Where redirects ended up
+    final_url = Column(Text, nullable=True)
+
+    # Timeout / connection error text, if any
+    error = Column(Text, nullable=True)
+
+    checked_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
 # -------------------------
 # USER SETTINGS TABLE
 # -------------------------
@@ -150,5 +345,107 @@ class UserSettings(Base):
     last_album = relationship("Album")
 
 
+# -------------------------
+# DATA VERSIONS
+# -------------------------
+
+class DataVersion(Base):
+    """
+    Monotonic counters bumped in the same transaction as the change:
+    "catalog" (albums, reviews, links), "user_state" (flags and
+    settings) and "user_flags" (listened / favorite / wishlist only).
+    Readers compare versions instead of re-reading the tables.
+    """
+    __tablename__ = "data_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+# -------------------------
+# BACKGROUND JOB QUEUE
+# -------------------------
+
+class Job(Base):
+    """
+    One unit of background work (see jobs.py).
+    A worker leases a job until lease_until; if it dies, the lease
+    expires and another worker picks the job up again.
+    """
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True)
+
+    # Handler name, e.g. "album_metadata"
+    kind = Column(String(50), nullable=False)
+
+    # JSON arguments for the handler
+    payload = Column(Text, nullable=False, default="{}")
+
+    # Same key = same job; enqueueing it again is a no-op
+    idempotency_key = Column(String, unique=True, nullable=True)
+
+    # queued / leased / done / failed
+    status = Column(String(10), nullable=False, default="queued")
+
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+
+    # Not before this time (used for retry backoff)
+    run_after = Column(DateTime(timezone=True), nullable=False)
+
+    lease_until = Column(DateTime(timezone=True), nullable=True)
+    leased_by = Column(String(100), nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    created_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+    )
+    updated_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
+
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+        Index("ix_jobs_status_lease_until", "status", "lease_until"),
+    )
+
+
+def _add_missing_columns():
+    """
+    create_all() never alters existing tables, so columns added to a model
+    after the DB was built are added here (nullable columns only).
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(
+                    f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {col_type}'
+                ))
+
+            # Rows older than their table's updated_at column would stay
+            # NULL, which delta sync can never select. Stamp them once with
+            # the migration time (later runs find nothing to update).
+            if "updated_at" in table.c:
+                conn.execute(
+                    table.update()
+                    .where(table.c.updated_at.is_(None))
+                    .values(updated_at=datetime.now(timezone.utc))
+                )
+
+
 def init_db():
     Base.metadata.create_all(engine)
+    _add_missing_columns()
@@ -0,0 +1,270 @@
+"""
+Precomputed, render-ready reviews.
+
+Splitting review_text into paragraphs and building the author/date/rating
+caption used to happen on every Streamlit rerun, with one st.write per
+paragraph. Here it happens once per review version (at import / migration
+time, or lazily when a new or edited review is first shown) and is stored in
+review_renders. The app then draws each review with a single st.markdown.
+
+    python review_render.py      # (re)build renders for changed reviews
+"""
+
+import hashlib
+import html
+import json
+import re
+import threading
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import SessionLocal, Review, ReviewRender, init_db
+
+
+BATCH_SIZE = 500
+
+_BLANK_LINES = re.compile(r"\n[ \t]*\n\s*")
+_TRAILING_SPACE = re.compile(r"[ \t]+\n")
+
+META_STYLE = "font-size:0.875rem;opacity:0.6;"
+
+# (review_id, content_hash) -> render dict, shared by all sessions
+_render_cache = {}
+_render_cache_lock = threading.Lock()
+
+
+# --------------------------------------
+# Building renders
+# --------------------------------------
+
+def normalise_text(text: str | None) -> str:
+    """
+    Unix newlines, no trailing spaces, paragraphs separated
+    by exactly one blank line.
+    """
+    text = (text or "").replace("\r\n", "\n").replace("\r", "\n")
+    text = _TRAILING_SPACE.sub("\n", text).strip()
+    return _BLANK_LINES.sub("\n\n", text)
+
+
+def paragraph_offsets(text: str) -> list:
+    """[start, end] of every paragraph in normalised text."""
+    offsets = []
+    start = 0
+    while start < len(text):
+        end = text.find("\n\n", start)
+        if end == -1:
+            end = len(text)
+        offsets.append([start, end])
+        start = end + 2
+    return offsets
+
+
+def format_meta_line(author, published_at, rating) -> str:
+    bits = []
+    if author:
+        bits.append(f"Author: {author}")
+    if published_at:
+        bits.append(f"Published: {published_at.strftime('%Y-%m-%d')}")
+    if rating is not None:
+        stars = "★" * rating + "☆" * (5 - rating)
+        bits.append(f"Rating: {rating}/5 {stars}")
+    return " | ".join(bits)
+
+
+def content_hash(author, published_at, rating, review_text) -> str:
+    source = "\x1f".join([
+        author or "",
+        published_at.isoformat() if published_at else "",
+        "" if rating is None else str(rating),
+        review_text or "",
+    ])
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+
+def _meta_html(meta_line: str) -> str:
+    # bold the "Author:" / "Published:" labels like the old caption did
+    parts = []
+    for bit in meta_line.split(" | "):
+        label, sep, value = bit.partition(": ")
+        if sep and label in ("Author", "Published"):
+            parts.append(f"<b>{html.escape(label)}:</b> {html.escape(value)}")
+        else:
+            parts.append(html.escape(bit))
+    return " | ".join(parts)
+
+
+def build_render(author, published_at, rating, review_text) -> dict:
+    """
+    Everything the UI needs to draw a review, as plain data.
+    Text is HTML-escaped, so the result is safe with unsafe_allow_html.
+    """
+    text = normalise_text(review_text)
+    offsets = paragraph_offsets(text)
+    meta_line = format_meta_line(author, published_at, rating)
+
+    chunks = []
+    if meta_line:
+        chunks.append(f'<p style="{META_STYLE}">{_meta_html(meta_line)}</p>')
+    for start, end in offsets:
+        paragraph = html.escape(text[start:end]).replace("\n", "<br>")
+        chunks.append(f"<p>{paragraph}</p>")
+
+    return {
+        "content_hash": content_hash(author, published_at, rating, review_text),
+        "meta_line": meta_line,
+        "paragraph_offsets": json.dumps(offsets),
+        "html": "\n".join(chunks),
+    }
+
+
+def _upsert_renders(db, rows: list):
+    stmt = sqlite_insert(ReviewRender.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["review_id"],
+        set_={
+            col: stmt.excluded[col]
+            for col in ("content_hash", "meta_line", "paragraph_offsets", "html")
+        },
+    )
+    db.execute(stmt, rows)
+
+
+def refresh_review_renders() -> int:
+    """
+    Build renders for new reviews and rebuild the ones whose
+    content hash changed. Safe to run after every import.
+    Returns how many renders were written.
+    """
+    db = SessionLocal()
+    written = 0
+    try:
+        known = dict(db.query(ReviewRender.review_id, ReviewRender.content_hash))
+
+        reviews = db.query(
+            Review.id, Review.author, Review.published_at,
+            Review.rating, Review.review_text,
+        ).yield_per(BATCH_SIZE)
+
+        batch = []
+        for review_id, author, published_at, rating, review_text in reviews:
+            digest = content_hash(author, published_at, rating, review_text)
+            if known.get(review_id) == digest:
+                continue
+            batch.append({
+                "review_id": review_id,
+                **build_render(author, published_at, rating, review_text),
+            })
+            if len(batch) >= BATCH_SIZE:
+                _upsert_renders(db, batch)
+                written += len(batch)
+                batch = []
+
+        if batch:
+            _upsert_renders(db, batch)
+            written += len(batch)
+
+        db.commit()
+    finally:
+        db.close()
+
+    return written
+
+
+# --------------------------------------
+# Reading renders
+# --------------------------------------
+
+def get_rendered_reviews(album_id: int) -> list:
+    """
+    Render dicts for an album's reviews, in the same order as
+    get_album_reviews(). Results are cached in-process by
+    (review_id, content_hash) of the review as it is now, so an edited
+    review is re-rendered (and its stored render replaced) instead of
+    serving the old HTML.
+    """
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(
+                Review.id, Review.author, Review.published_at,
+                Review.rating, Review.review_text, ReviewRender.content_hash,
+            )
+            .outerjoin(ReviewRender, ReviewRender.review_id == Review.id)
+            .filter(Review.album_id == album_id)
+            .order_by(Review.published_at.asc().nulls_last(), Review.id.asc())
+            .all()
+        )
+
+        result = []
+        to_load = []
+        to_build = []
+        for review_id, author, published_at, rating, review_text, stored in rows:
+            digest = content_hash(author, published_at, rating, review_text)
+            with _render_cache_lock:
+                cached = _render_cache.get((review_id, digest))
+            result.append(cached)
+            if cached is not None:
+                continue
+            if stored == digest:
+                to_load.append(review_id)
+            else:
+                to_build.append((review_id, author, published_at, rating, review_text))
+
+        renders = _load_renders(db, to_load) if to_load else {}
+        if to_build:
+            renders.update(_build_renders(db, to_build))
+        if renders:
+            with _render_cache_lock:
+                for render in renders.values():
+                    _render_cache[(render["review_id"], render["content_hash"])] = render
+
+        return [
+            render if render is not None else renders[row[0]]
+            for row, render in zip(rows, result)
+        ]
+    finally:
+        db.close()
+
+
+def _load_renders(db, review_ids: list) -> dict:
+    renders = {}
+    for render in db.query(ReviewRender).filter(ReviewRender.review_id.in_(review_ids)):
+        renders[render.review_id] = {
+            "review_id": render.review_id,
+            "content_hash": render.content_hash,
+            "meta_line": render.meta_line,
+            "paragraph_offsets": render.paragraph_offsets,
+            "html": render.html,
+        }
+    return renders
+
+
+def _build_renders(db, reviews: list) -> dict:
+    """Render (review_id, author, published_at, rating, review_text) rows and store them."""
+    renders = {}
+    for review_id, author, published_at, rating, review_text in reviews:
+        renders[review_id] = {
+            "review_id": review_id,
+            **build_render(author, published_at, rating, review_text),
+        }
+    _upsert_renders(db, list(renders.values()))
+    db.commit()
+    return renders
+
+
+# --------------------------------------
+# Drawing
+# --------------------------------------
+
+def render_review(st, render: dict, heading: str | None = None):
+    """Draw one review as a single Streamlit element."""
+    body = render["html"]
+    if heading:
+        body = f"<h4>{html.escape(heading)}</h4>\n{body}"
+    st.markdown(f"{body}\n<hr>", unsafe_allow_html=True)
+
+
+if __name__ == "__main__":
+    init_db()
+    print(f"review renders written: {refresh_review_renders()}")
@@ -0,0 +1,607 @@
+"""
+Columnar snapshot of the catalog and user state, for analytics.
+
+    python snapshot.py build                 # incremental
+    python snapshot.py build --full
+    python snapshot.py stats                 # favorite rate by label, progress
+
+Tables are streamed out of SQLite in chunks and written twice:
+
+- `<part>-<stamp>-<pid>.arrow` — uncompressed Arrow IPC files.
+  load_snapshot() memory-maps the newest one per part, so columns are
+  NumPy / Arrow views over the page cache: no parsing, no per-row
+  Python objects. Every build gets a new file instead of replacing the
+  old one, which may still be mapped (Windows refuses to replace or
+  delete a mapped file); older files are removed when nothing holds
+  them any more.
+- `<part>.parquet` — the same data, compressed, for pandas / DuckDB / polars.
+
+Artist (canonical name, see artist_resolution.py), label and genre are
+dictionary-encoded: one int32 code per album plus a small dictionary, so
+group-bys are np.bincount() over the codes.
+
+Each file records the data version it was built from (catalog, or
+user_flags for user state) in its schema metadata. build_snapshot()
+rewrites only the parts whose version moved: a flag toggle rewrites the
+small user-state files and leaves the catalog alone, and opening an
+album (set_last_album) rewrites nothing.
+"""
+
+import argparse
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased
+
+from logic import get_data_versions
+from models import SessionLocal, Album, Artist, ArtistAlias, Review, UserAlbum, init_db
+
+
+SNAPSHOT_DIR = "snapshot"
+
+# Bump when the columns below change, so old snapshots are rebuilt
+SCHEMA_VERSION = 1
+
+CHUNK_ROWS = 10_000
+
+CATALOG_SCHEMA = pa.schema([
+    ("album_id", pa.int64()),
+    ("artist", pa.dictionary(pa.int32(), pa.string())),
+    ("label", pa.dictionary(pa.int32(), pa.string())),
+    ("genre", pa.dictionary(pa.int32(), pa.string())),
+    ("year", pa.int16()),
+    ("review_count", pa.int32()),
+    ("avg_rating", pa.float32()),
+])
+
+USER_STATE_SCHEMA = pa.schema([
+    ("user_id", pa.int32()),
+    ("album_id", pa.int64()),
+    ("listened", pa.int8()),
+    ("favorite", pa.int8()),
+    ("wishlist", pa.int8()),
+    ("updated_at", pa.timestamp("us", tz="UTC")),
+])
+
+# part name -> data version it depends on
+# (user_flags, not user_state: set_last_album moves the latter on every
+# album click, and nothing in user_albums changes then)
+PARTS = {"catalog": "catalog", "user_state": "user_flags"}
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------------------
+# Reading the DB in chunks
+# --------------------------------------
+
+def _canonical_artist():
+    canonical = aliased(Artist)
+    name = func.coalesce(canonical.name, Artist.name)
+    return canonical, name
+
+
+def _dictionary(db, column, join=None):
+    """
+    Sorted distinct values of `column` as an Arrow dictionary plus a
+    value -> code map. NULL gets a code too (a null dictionary entry),
+    so the code arrays themselves never contain nulls.
+    """
+    query = select(column).distinct()
+    if join is not None:
+        query = join(query)
+    values = sorted(db.execute(query).scalars(), key=lambda v: (v is not None, v or ""))
+    codes = {value: i for i, value in enumerate(values)}
+    return pa.array(values, pa.string()), codes
+
+
+def _encode(values, codes, dictionary):
+    # every batch shares the same dictionary, so the IPC file stores it once
+    indices = pa.array([codes[v] for v in values], pa.int32())
+    return pa.DictionaryArray.from_arrays(indices, dictionary)
+
+
+def _catalog_batches(db):
+    canonical, artist_name = _canonical_artist()
+
+    def join_artist(query):
+        return (
+            query
+            .select_from(Album)
+            .outerjoin(Artist, Album.artist_id == Artist.id)
+            .outerjoin(ArtistAlias, ArtistAlias.artist_id == Artist.id)
+            .outerjoin(canonical, canonical.id == ArtistAlias.canonical_artist_id)
+        )
+
+    artists, artist_codes = _dictionary(db, artist_name, join_artist)
+    labels, label_codes = _dictionary(db, Album.label)
+    genres, genre_codes = _dictionary(db, Album.genre)
+
+    reviews = (
+        select(
+            Review.album_id,
+            func.count(Review.id).label("review_count"),
+            func.avg(Review.rating).label("avg_rating"),
+        )
+        .group_by(Review.album_id)
+        .subquery()
+    )
+    query = join_artist(
+        select(
+            Album.id, artist_name, Album.label, Album.genre, Album.year,
+            func.coalesce(reviews.c.review_count, 0), reviews.c.avg_rating,
+        )
+    ).outerjoin(reviews, reviews.c.album_id == Album.id).order_by(Album.id)
+
+    result = db.execute(query.execution_options(yield_per=CHUNK_ROWS))
+    for rows in result.partitions():
+        ids, artist, label, genre, year, count, rating = zip(*rows)
+        yield pa.record_batch([
+            pa.array(ids, pa.int64()),
+            _encode(artist, artist_codes, artists),
+            _encode(label, label_codes, labels),
+            _encode(genre, genre_codes, genres),
+            pa.array(year, pa.int16()),
+            pa.array(count, pa.int32()),
+            pa.array(rating, pa.float32()),
+        ], schema=CATALOG_SCHEMA)
+
+
+def _user_state_batches(db):
+    query = (
+        select(
+            UserAlbum.user_id,
+            UserAlbum.album_id,
+            func.coalesce(UserAlbum.listened, 0),
+            func.coalesce(UserAlbum.favorite, 0),
+            func.coalesce(UserAlbum.wishlist, 0),
+            UserAlbum.updated_at,
+        )
+        .order_by(UserAlbum.album_id, UserAlbum.user_id)
+    )
+    result = db.execute(query.execution_options(yield_per=CHUNK_ROWS))
+    for rows in result.partitions():
+        # naive datetimes from SQLite are UTC, which is how pyarrow reads them
+        columns = zip(*rows)
+        yield pa.record_batch(
+            [pa.array(col, field.type) for col, field in zip(columns, USER_STATE_SCHEMA)],
+            schema=USER_STATE_SCHEMA,
+        )
+
+
+# --------------------------------------
+# Writing
+# --------------------------------------
+
+def _for_parquet(batch):
+    """
+    Parquet cannot store a null inside a dictionary: move it into the
+    indices (the usual Arrow form). NULL always has code 0, see _dictionary().
+    """
+    columns = []
+    for col in batch.columns:
+        if pa.types.is_dictionary(col.type) and len(col.dictionary) and not col.dictionary[0].is_valid:
+            indices = col.indices.to_numpy()
+            col = pa.DictionaryArray.from_arrays(
+                pa.array(indices - 1, pa.int32(), mask=indices == 0),
+                col.dictionary.slice(1),
+            )
+        columns.append(col)
+    return pa.record_batch(columns, schema=batch.schema)
+
+
+def _part_files(out_dir: str, name: str) -> list[str]:
+    """Built .arrow files of a part, newest first."""
+    pattern = re.compile(rf"{re.escape(name)}-(\d+)-\d+\.arrow")
+    try:
+        entries = os.listdir(out_dir)
+    except OSError:
+        return []
+    found = [(int(m.group(1)), entry) for entry in entries if (m := pattern.fullmatch(entry))]
+    return [os.path.join(out_dir, entry) for _, entry in sorted(found, reverse=True)]
+
+
+def _remove_old_files(out_dir: str, name: str, keep: str):
+    """
+    Best effort: files still mapped (by this process or another) cannot
+    be deleted on Windows; they are retried after the next build.
+    """
+    stale = [path for path in _part_files(out_dir, name) if path != keep]
+    # files from before builds were versioned
+    stale.append(os.path.join(out_dir, f"{name}.arrow"))
+    for path in stale:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _write_part(out_dir: str, name: str, schema, batches, version: int) -> int:
+    """
+    Stream batches into a new <name>-<stamp>-<pid>.arrow and <name>.parquet.
+    The data version goes into the files' schema metadata, so each file
+    says what it was built from; file and version are replaced together.
+    Files are written under unique temporary names and renamed into
+    place, so concurrent builders do not collide. The .arrow file gets a
+    name of its own rather than replacing the current one, so readers
+    that still have the old file mapped keep a valid view.
+    """
+    schema = schema.with_metadata({
+        "snapshot_schema": str(SCHEMA_VERSION),
+        "version": str(version),
+        "built_at": datetime.now(timezone.utc).isoformat(),
+    })
+    targets = {
+        "arrow": os.path.join(out_dir, f"{name}-{time.time_ns()}-{os.getpid()}.arrow"),
+        "parquet": os.path.join(out_dir, f"{name}.parquet"),
+    }
+    temps = {}
+    for ext in targets:
+        fd, temps[ext] = tempfile.mkstemp(dir=out_dir, prefix=f".{name}-", suffix=f".{ext}.tmp")
+        os.close(fd)
+
+    rows = 0
+    try:
+        with pa.OSFile(temps["arrow"], "wb") as sink, \
+                pa.ipc.new_file(sink, schema) as arrow_writer, \
+                pq.ParquetWriter(temps["parquet"], schema, compression="zstd") as parquet_writer:
+            for batch in batches:
+                batch = batch.replace_schema_metadata(schema.metadata)
+                arrow_writer.write_batch(batch)
+                parquet_writer.write_batch(_for_parquet(batch))
+                rows += batch.num_rows
+
+        for ext, target in targets.items():
+            os.replace(temps[ext], target)
+    finally:
+        for temp in temps.values():
+            if os.path.exists(temp):
+                os.remove(temp)
+    _remove_old_files(out_dir, name, keep=targets["arrow"])
+    return rows
+
+
+def read_part_info(out_dir: str, name: str) -> dict | None:
+    """
+    {"version", "built_at", "rows"} of a built part, read from the
+    newest .arrow file's footer only; None if missing or from another schema.
+    """
+    for path in _part_files(out_dir, name):
+        try:
+            with pa.memory_map(path, "r") as source:
+                reader = pa.ipc.open_file(source)
+                meta = reader.schema.metadata or {}
+                rows = sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+        except (OSError, pa.ArrowInvalid):
+            # removed by a newer build since listing
+            continue
+        return _part_info(meta, rows)
+    return None
+
+
+def _part_info(meta: dict, rows: int) -> dict | None:
+    if meta.get(b"snapshot_schema") != str(SCHEMA_VERSION).encode():
+        return None
+    return {
+        "version": int(meta[b"version"]),
+        "built_at": meta[b"built_at"].decode(),
+        "rows": rows,
+    }
+
+
+# one build at a time per process; other processes only ever see
+# complete files (unique temp names + rename, a new .arrow per build)
+_build_lock = threading.Lock()
+
+
+def build_snapshot(out_dir: str = SNAPSHOT_DIR, full: bool = False,
+                   versions: dict | None = None) -> dict:
+    """
+    Bring the snapshot in `out_dir` up to date with the DB.
+    Only parts whose data version changed since the last build are
+    rewritten (all of them with full=True).
+    Returns {part: rows written} for the parts that were rebuilt.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    if versions is None:
+        versions = get_data_versions()
+
+    builders = {
+        "catalog": (CATALOG_SCHEMA, _catalog_batches),
+        "user_state": (USER_STATE_SCHEMA, _user_state_batches),
+    }
+    written = {}
+    with _build_lock:
+        # checked under the lock: a build that just finished may have
+        # done the work already
+        stale = [
+            name for name, version_name in PARTS.items()
+            if full
+            or (read_part_info(out_dir, name) or {}).get("version") != versions[version_name]
+        ]
+        if not stale:
+            return {}
+
+        db = SessionLocal()
+        try:
+            for name in stale:
+                schema, batches = builders[name]
+                written[name] = _write_part(
+                    out_dir, name, schema, batches(db), versions[PARTS[name]]
+                )
+        finally:
+            db.close()
+
+    return written
+
+
+# --------------------------------------
+# Loading (zero-copy)
+# --------------------------------------
+
+class Snapshot:
+    """
+    Memory-mapped snapshot. `catalog` and `user_state` are pyarrow
+    Tables backed by the mapped files; column() returns NumPy views.
+    """
+
+    def __init__(self, out_dir: str, catalog: pa.Table, user_state: pa.Table):
+        self.out_dir = out_dir
+        self.catalog = catalog
+        self.user_state = user_state
+
+    @property
+    def parts(self) -> dict:
+        """{part: {"version", "built_at", "rows"}} of the mapped files."""
+        return {
+            name: _part_info(getattr(self, name).schema.metadata or {}, getattr(self, name).num_rows)
+            for name in PARTS
+        }
+
+    @property
+    def versions(self) -> dict:
+        """{part: data version it was built from}."""
+        return {name: info["version"] for name, info in self.parts.items()}
+
+    def column(self, table: str, name: str) -> np.ndarray:
+        """
+        NumPy view of a column without copying. Dictionary columns
+        return their int32 codes (see dictionary()). Raises if the
+        column has nulls (e.g. year, avg_rating) — use the Arrow
+        column for those.
+        """
+        col = getattr(self, table).column(name).combine_chunks()
+        if pa.types.is_dictionary(col.type):
+            col = col.indices
+        return col.to_numpy(zero_copy_only=True)
+
+    def dictionary(self, name: str) -> list:
+        """Values behind the codes of a catalog dictionary column."""
+        col = self.catalog.column(name)
+        if col.num_chunks == 0:
+            return []
+        return col.chunk(0).dictionary.to_pylist()
+
+
+def _map_table(path: str) -> pa.Table:
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def _map_newest(out_dir: str, name: str) -> pa.Table | None:
+    # a newer build may remove a file between listing and mapping it;
+    # the file that replaced it shows up when listing again
+    for _ in range(3):
+        for path in _part_files(out_dir, name):
+            try:
+                return _map_table(path)
+            except (OSError, pa.ArrowInvalid):
+                continue
+    return None
+
+
+def load_snapshot(out_dir: str = SNAPSHOT_DIR) -> Snapshot:
+    """Memory-map the newest .arrow file of each part of a built snapshot."""
+    tables = {}
+    for name in PARTS:
+        table = _map_newest(out_dir, name)
+        if table is None or _part_info(table.schema.metadata or {}, 0) is None:
+            raise FileNotFoundError(f"no snapshot in {out_dir!r}; run `python snapshot.py build`")
+        tables[name] = table
+    return Snapshot(out_dir, tables["catalog"], tables["user_state"])
+
+
+# out_dir -> last loaded Snapshot, shared by all sessions
+_current = {}
+_current_lock = threading.Lock()
+_refreshing = set()
+
+
+def _wanted_versions(versions: dict) -> dict:
+    return {name: versions[version_name] for name, version_name in PARTS.items()}
+
+
+def _refresh(out_dir: str, versions: dict | None = None) -> Snapshot:
+    build_snapshot(out_dir, versions=versions)
+    snap = load_snapshot(out_dir)
+    with _current_lock:
+        _current[out_dir] = snap
+    return snap
+
+
+def refresh_in_background(out_dir: str = SNAPSHOT_DIR) -> bool:
+    """
+    Rebuild stale parts and re-map in a daemon thread.
+    Returns False if a refresh for `out_dir` is already running.
+    """
+    with _current_lock:
+        if out_dir in _refreshing:
+            return False
+        _refreshing.add(out_dir)
+
+    def run():
+        try:
+            _refresh(out_dir)
+        except Exception:
+            # nobody joins this thread: without this the error is lost
+            logger.exception("snapshot refresh of %r failed", out_dir)
+        finally:
+            with _current_lock:
+                _refreshing.discard(out_dir)
+
+    threading.Thread(target=run, name="snapshot-refresh", daemon=True).start()
+    return True
+
+
+def get_current_snapshot(out_dir: str = SNAPSHOT_DIR, wait: bool = True) -> Snapshot:
+    """
+    Snapshot matching the DB: rebuilds stale parts and re-maps only
+    when the data versions moved (one small query when nothing changed).
+    With wait=False a stale snapshot is returned as is while a
+    background refresh runs (the UI path: no rebuild during a rerun);
+    only the very first build blocks.
+    """
+    versions = _wanted_versions(get_data_versions())
+    with _current_lock:
+        snap = _current.get(out_dir)
+    if snap is not None and snap.versions == versions:
+        return snap
+
+    if not wait:
+        if snap is None:
+            try:
+                snap = load_snapshot(out_dir)
+            except FileNotFoundError:
+                snap = None
+            else:
+                with _current_lock:
+                    _current.setdefault(out_dir, snap)
+        if snap is not None:
+            if snap.versions != versions:
+                refresh_in_background(out_dir)
+            return snap
+
+    return _refresh(out_dir)
+
+
+# --------------------------------------
+# Vectorised analytics
+# --------------------------------------
+
+def _album_rows(snap: Snapshot, user_id: int | None):
+    """
+    Row index into the catalog for each user_state row (catalog is
+    sorted by album_id), plus a mask of rows to use.
+    """
+    catalog_ids = snap.column("catalog", "album_id")
+    state_ids = snap.column("user_state", "album_id")
+    rows = np.searchsorted(catalog_ids, state_ids)
+    rows = np.minimum(rows, max(len(catalog_ids) - 1, 0))
+    mask = catalog_ids[rows] == state_ids if len(catalog_ids) else np.zeros(len(state_ids), bool)
+    if user_id is not None:
+        mask &= snap.column("user_state", "user_id") == user_id
+    return rows, mask
+
+
+def flag_rate_by(snap: Snapshot, by: str = "label", flag: str = "favorite",
+                 user_id: int | None = None, min_albums: int = 1) -> list[dict]:
+    """
+    Share of albums per artist / label / genre that carry `flag`.
+    With user_id=None this is across all users: flagged (user, album)
+    pairs / (albums in the group x users with any state).
+    Sorted by rate, then album count.
+    """
+    codes = snap.column("catalog", by)
+    names = snap.dictionary(by)
+    albums = np.bincount(codes, minlength=len(names))
+
+    rows, mask = _album_rows(snap, user_id)
+    flags = snap.column("user_state", flag)[mask]
+    flagged = np.bincount(codes[rows[mask]], weights=flags, minlength=len(names))
+
+    if user_id is None:
+        users = max(len(np.unique(snap.column("user_state", "user_id"))), 1)
+    else:
+        users = 1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.where(albums > 0, flagged / (albums * users), 0.0)
+
+    keep = np.flatnonzero(albums >= min_albums)
+    order = keep[np.lexsort((-albums[keep], -rate[keep]))]
+    return [
+        {by: names[i], "albums": int(albums[i]), flag: int(flagged[i]), "rate": float(rate[i])}
+        for i in order
+    ]
+
+
+def favorite_rate_by_label(snap: Snapshot, user_id: int | None = None,
+                           min_albums: int = 1) -> list[dict]:
+    return flag_rate_by(snap, "label", "favorite", user_id, min_albums)
+
+
+def get_progress(snap: Snapshot, user_id: int = 1) -> dict:
+    """
+    {"albums", "listened", "favorite", "wishlist"} totals for one user,
+    the same numbers the sidebar shows, from one pass over the arrays.
+    """
+    _, mask = _album_rows(snap, user_id)
+    totals = {"albums": snap.catalog.num_rows}
+    for flag in ("listened", "favorite", "wishlist"):
+        totals[flag] = int(snap.column("user_state", flag)[mask].sum(dtype=np.int64))
+    return totals
+
+
+# --------------------------------------
+# CLI
+# --------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar snapshot for analytics.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="write / refresh the snapshot")
+    build.add_argument("out_dir", nargs="?", default=SNAPSHOT_DIR)
+    build.add_argument("--full", action="store_true", help="rebuild every part")
+
+    stats = sub.add_parser("stats", help="favorite rate by label and listening progress")
+    stats.add_argument("out_dir", nargs="?", default=SNAPSHOT_DIR)
+    stats.add_argument("--by", choices=("label", "artist", "genre"), default="label")
+    stats.add_argument("--min-albums", type=int, default=5)
+    stats.add_argument("--top", type=int, default=20)
+
+    args = parser.parse_args()
+    init_db()
+
+    if args.command == "build":
+        started = time.perf_counter()
+        written = build_snapshot(args.out_dir, full=args.full)
+        elapsed = time.perf_counter() - started
+        if not written:
+            print("snapshot is up to date")
+        for name, rows in written.items():
+            print(f"{name}: {rows} rows")
+        print(f"{elapsed:.2f}s")
+        return
+
+    snap = get_current_snapshot(args.out_dir)
+    rates = flag_rate_by(snap, args.by, "favorite", min_albums=args.min_albums)
+    progress = get_progress(snap)
+
+    for row in rates[:args.top]:
+        print(f"{row['rate']:6.1%}  {row['favorite']:4d} / {row['albums']:<5d} {row[args.by]}")
+    print(
+        f"listened {progress['listened']} / {progress['albums']}, "
+        f"{progress['favorite']} favorites, {progress['wishlist']} on wishlist"
+    )
+
+
+if __name__ == "__main__":
+    main()
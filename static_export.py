@@ -0,0 +1,363 @@
+"""
+Static HTML export of the whole archive, for read-only hosting.
+
+    python static_export.py site/            # incremental
+    python static_export.py site/ --full     # ignore the manifest
+
+Writes one page per album (artist, year / label caption, all reviews,
+links), scope index pages (all / listened / favorites / wishlist) and a
+prebuilt search index. Page contents are hashed first; only pages whose
+hash differs from the last export's manifest are rendered, and those are
+rendered in a process pool.
+"""
+
+import argparse
+import hashlib
+import html
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from logic import get_albums_for_scope, join_canonical_artist
+from models import SessionLocal, Album, AlbumLink, AlbumLinkHealth, Artist, Review, ReviewRender, init_db
+from review_render import refresh_review_renders
+
+
+# Bump when the HTML templates change, so every page is re-rendered
+TEMPLATE_VERSION = "1"
+
+MANIFEST_NAME = ".export-manifest.json"
+
+SCOPES = {
+    "index.html": ("All albums", dict(scope="all")),
+    "listened.html": ("Listened", dict(scope="listened")),
+    "favorites.html": ("Favorites", dict(scope="all", only_favorites=True)),
+    "wishlist.html": ("Wishlist", dict(scope="all", only_wishlist=True)),
+}
+
+STYLE = """
+body { background:#111; color:#ddd; font-family:Georgia,serif; max-width:48rem; margin:2rem auto; padding:0 1rem; }
+a { color:#b48cff; }
+nav a { margin-right:1rem; }
+.caption, .meta { font-size:0.875rem; opacity:0.6; }
+ul.albums { list-style:none; padding:0; }
+ul.albums li { margin:0.2rem 0; }
+#search { width:100%; padding:0.4rem; margin:1rem 0; background:#222; color:#ddd; border:1px solid #444; }
+"""
+
+SEARCH_JS = """
+(async function () {
+  const box = document.getElementById("search");
+  const out = document.getElementById("results");
+  if (!box) return;
+  const index = await (await fetch("search-index.json")).json();
+  box.addEventListener("input", () => {
+    const q = box.value.trim().toLowerCase();
+    out.innerHTML = "";
+    if (q.length < 2) return;
+    for (const e of index.filter(e => e.k.includes(q)).slice(0, 50)) {
+      const li = document.createElement("li");
+      const a = document.createElement("a");
+      a.href = e.u;
+      a.textContent = e.a + " — " + e.t + (e.y ? " (" + e.y + ")" : "");
+      li.appendChild(a);
+      out.appendChild(li);
+    }
+  });
+})();
+"""
+
+
+# --------------------------------------
+# Collecting page contents (main process, DB)
+# --------------------------------------
+
+def album_path(album_id: int) -> str:
+    return f"albums/{album_id}.html"
+
+
+def _caption(year, label, genre) -> str:
+    return " | ".join(str(bit) for bit in (year, label, genre) if bit)
+
+
+def collect_album_pages() -> dict:
+    """path -> page payload (plain data, picklable) for every album."""
+    db = SessionLocal()
+    try:
+        albums = {}
+        query, sort_name = join_canonical_artist(
+            db.query(Album.id, Artist.name, Album.title, Album.year, Album.label,
+                     Album.genre, Album.review_url)
+            .outerjoin(Artist, Artist.id == Album.artist_id)
+        )
+        for album_id, artist, title, year, label, genre, review_url, sort in (
+            query.add_columns(sort_name)
+        ):
+            albums[album_id] = {
+                "kind": "album",
+                "id": album_id,
+                "artist": artist or "Unknown artist",
+                "sort_artist": sort or artist or "",
+                "title": title or "Unknown title",
+                "caption": _caption(year, label, genre),
+                "year": year,
+                "label": label,
+                "review_url": review_url,
+                "reviews": [],
+                "links": [],
+            }
+
+        reviews = (
+            db.query(Review.album_id, ReviewRender.html)
+            .join(ReviewRender, ReviewRender.review_id == Review.id)
+            .order_by(Review.album_id, Review.published_at.asc().nulls_last(), Review.id.asc())
+        )
+        for album_id, review_html in reviews:
+            if album_id in albums:
+                albums[album_id]["reviews"].append(review_html)
+
+        links = (
+            db.query(AlbumLink.album_id, AlbumLink.source, AlbumLink.url,
+                     AlbumLinkHealth.ok, AlbumLinkHealth.url_checked)
+            .outerjoin(AlbumLinkHealth, AlbumLinkHealth.link_id == AlbumLink.id)
+            .order_by(AlbumLink.album_id, AlbumLink.id)
+        )
+        for album_id, source, url, ok, url_checked in links:
+            if album_id not in albums:
+                continue
+            # only trust a health result for the URL it was made for
+            alive = None if url_checked != url else bool(ok)
+            albums[album_id]["links"].append({"source": source, "url": url, "alive": alive})
+    finally:
+        db.close()
+
+    return {album_path(album_id): page for album_id, page in albums.items()}
+
+
+def collect_index_pages(album_pages: dict) -> dict:
+    pages = {}
+    for path, (title, filters) in SCOPES.items():
+        entries = [
+            {
+                "path": album_path(a.id),
+                "artist": a.artist.name if a.artist else "Unknown",
+                "title": a.title or "Unknown title",
+                "year": a.year,
+            }
+            for a in get_albums_for_scope(**filters)
+            if album_path(a.id) in album_pages
+        ]
+        pages[path] = {"kind": "index", "title": title, "entries": entries,
+                       "search": path == "index.html"}
+    return pages
+
+
+def build_search_index(album_pages: dict) -> list:
+    index = []
+    for path, page in sorted(album_pages.items(), key=lambda item: item[1]["id"]):
+        key = " ".join(
+            str(bit) for bit in (page["artist"], page["sort_artist"], page["title"],
+                                 page["year"], page["label"]) if bit
+        ).lower()
+        index.append({"u": path, "a": page["artist"], "t": page["title"],
+                      "y": page["year"], "k": key})
+    return index
+
+
+def page_hash(payload) -> str:
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1((TEMPLATE_VERSION + raw).encode("utf-8")).hexdigest()
+
+
+# --------------------------------------
+# Rendering (worker processes, no DB)
+# --------------------------------------
+
+def _layout(title: str, body: str, root: str) -> str:
+    nav = " ".join(
+        f'<a href="{root}{path}">{html.escape(name)}</a>'
+        for path, (name, _) in SCOPES.items()
+    )
+    return (
+        "<!doctype html>\n<html lang=\"ru\"><head><meta charset=\"utf-8\">"
+        f"<title>{html.escape(title)} — Undead Archive</title>"
+        f'<link rel="stylesheet" href="{root}style.css"></head>\n'
+        f"<body><nav>{nav}</nav>\n{body}\n</body></html>\n"
+    )
+
+
+def render_album_page(page: dict) -> str:
+    e = html.escape
+    parts = [f"<h1>{e(page['artist'])} — {e(page['title'])}</h1>"]
+    if page["caption"]:
+        parts.append(f'<p class="caption">{e(page["caption"])}</p>')
+
+    if page["links"]:
+        items = []
+        for link in page["links"]:
+            badge = {True: "🟢", False: "🔴", None: ""}[link["alive"]]
+            items.append(
+                f'<li>{badge} <a href="{e(link["url"])}" rel="noopener">{e(link["source"])}</a></li>'
+            )
+        parts.append("<h2>Listen</h2><ul>" + "".join(items) + "</ul>")
+
+    parts.append("<h2>Original reviews (Russian)</h2>")
+    if not page["reviews"]:
+        parts.append("<p>No review text found for this album.</p>")
+    for idx, review_html in enumerate(page["reviews"], start=1):
+        if len(page["reviews"]) > 1:
+            parts.append(f"<h3>Review {idx}</h3>")
+        # review_renders html is already escaped
+        parts.append(f"<article>{review_html}</article><hr>")
+
+    if page["review_url"]:
+        parts.append(f'<p class="meta"><a href="{e(page["review_url"])}">Original page</a></p>')
+
+    return _layout(f"{page['artist']} — {page['title']}", "\n".join(parts), "../")
+
+
+def render_index_page(page: dict) -> str:
+    e = html.escape
+    parts = [f"<h1>🦇 Undead Archive — {e(page['title'])}</h1>",
+             f'<p class="caption">{len(page["entries"])} albums</p>']
+    if page["search"]:
+        parts.append('<input id="search" placeholder="Search artist, album, year, label…">'
+                     '<ul id="results" class="albums"></ul>'
+                     '<script src="search.js"></script>')
+    items = []
+    for entry in page["entries"]:
+        year = f" ({entry['year']})" if entry["year"] else ""
+        items.append(
+            f'<li><a href="{entry["path"]}">{e(entry["artist"])} — {e(entry["title"])}</a>{year}</li>'
+        )
+    parts.append('<ul class="albums">' + "".join(items) + "</ul>")
+    return _layout(page["title"], "\n".join(parts), "")
+
+
+def render_pages(out_dir: str, jobs: list) -> int:
+    """Render and write a chunk of (path, payload); runs in a worker."""
+    for path, page in jobs:
+        text = render_album_page(page) if page["kind"] == "album" else render_index_page(page)
+        _write_text(os.path.join(out_dir, path), text)
+    return len(jobs)
+
+
+def _write_text(path: str, text: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fp:
+        fp.write(text)
+    os.replace(tmp, path)
+
+
+# --------------------------------------
+# Export driver
+# --------------------------------------
+
+def _load_manifest(out_dir: str) -> dict:
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), encoding="utf-8") as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return {}
+
+
+def export_site(out_dir: str, full: bool = False, workers: int | None = None,
+                chunk_size: int = 50) -> dict:
+    """
+    Export the archive to `out_dir`. Returns counts and timings:
+    {"pages", "rendered", "skipped", "removed", "seconds",
+     "pages_per_second", "rendered_per_second"}.
+    """
+    started = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+
+    refresh_review_renders()
+    album_pages = collect_album_pages()
+    pages = {**album_pages, **collect_index_pages(album_pages)}
+
+    search_index = build_search_index(album_pages)
+    assets = {
+        "style.css": STYLE.lstrip(),
+        "search.js": SEARCH_JS.lstrip(),
+        "search-index.json": json.dumps(search_index, ensure_ascii=False, separators=(",", ":")),
+    }
+
+    # still loaded with full=True: it lists the pages to prune below
+    old_manifest = _load_manifest(out_dir)
+
+    def needs_write(path, digest):
+        return (
+            full
+            or old_manifest.get(path) != digest
+            or not os.path.exists(os.path.join(out_dir, path))
+        )
+
+    manifest = {}
+    changed = []
+    for path, payload in pages.items():
+        digest = page_hash(payload)
+        manifest[path] = digest
+        if needs_write(path, digest):
+            changed.append((path, payload))
+
+    for path, text in assets.items():
+        digest = page_hash(text)
+        manifest[path] = digest
+        if needs_write(path, digest):
+            _write_text(os.path.join(out_dir, path), text)
+
+    render_started = time.perf_counter()
+    chunks = [changed[i:i + chunk_size] for i in range(0, len(changed), chunk_size)]
+    if len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(render_pages, [out_dir] * len(chunks), chunks))
+    elif chunks:
+        render_pages(out_dir, chunks[0])
+    render_seconds = time.perf_counter() - render_started
+
+    # pages of albums that no longer exist
+    removed = 0
+    for path in set(old_manifest) - set(manifest):
+        try:
+            os.remove(os.path.join(out_dir, path))
+            removed += 1
+        except OSError:
+            pass
+
+    _write_text(os.path.join(out_dir, MANIFEST_NAME), json.dumps(manifest, indent=0, sort_keys=True))
+
+    seconds = time.perf_counter() - started
+    return {
+        "pages": len(pages),
+        "rendered": len(changed),
+        "skipped": len(pages) - len(changed),
+        "removed": removed,
+        "seconds": seconds,
+        "pages_per_second": len(pages) / seconds if seconds else 0.0,
+        "rendered_per_second": len(changed) / render_seconds if changed else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the archive as a static site.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--full", action="store_true", help="re-render every page")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    init_db()
+    stats = export_site(args.out_dir, full=args.full, workers=args.workers)
+    print(
+        f"pages: {stats['pages']} (rendered {stats['rendered']}, "
+        f"unchanged {stats['skipped']}, removed {stats['removed']})"
+    )
+    print(
+        f"time: {stats['seconds']:.2f} s, {stats['pages_per_second']:.0f} pages/s overall, "
+        f"{stats['rendered_per_second']:.0f} pages/s rendering"
+    )
+
+
+if __name__ == "__main__":
+    main()
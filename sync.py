@@ -0,0 +1,310 @@
+"""
+Move user state (user_albums, user_settings, album_links) between machines.
+
+    python sync.py export state.ndjson
+    python sync.py export delta.ndjson --since 2026-01-01T00:00:00+00:00
+    python sync.py import delta.ndjson
+
+Export streams rows (never the whole DB) as NDJSON or CSV.
+Import merges row by row with last-writer-wins on updated_at,
+in one batched transaction.
+"""
+
+import argparse
+import csv
+import json
+import sys
+from datetime import datetime, timezone
+
+from logic import bump_version
+from models import SessionLocal, UserAlbum, UserSettings, AlbumLink, Album, init_db
+
+
+BATCH_SIZE = 500
+
+# table name -> (model, natural key columns, value columns)
+SYNC_TABLES = {
+    "user_albums": (
+        UserAlbum,
+        ("user_id", "album_id"),
+        ("listened", "favorite", "wishlist"),
+    ),
+    "user_settings": (
+        UserSettings,
+        ("user_id",),
+        ("last_album_id", "random_mode_enabled"),
+    ),
+    "album_links": (
+        AlbumLink,
+        ("album_id", "source", "url"),
+        (),
+    ),
+}
+
+INT_COLUMNS = {
+    "user_id", "album_id", "listened", "favorite", "wishlist",
+    "last_album_id", "random_mode_enabled",
+}
+
+# Union of all columns, used as the CSV header
+CSV_COLUMNS = ["table"] + sorted(
+    {col for _, key, values in SYNC_TABLES.values() for col in key + values}
+) + ["updated_at"]
+
+
+# --------------------------------------
+# Timestamp helpers
+# --------------------------------------
+
+def _as_utc(value: datetime | None):
+    """SQLite hands back naive datetimes; they are always UTC here."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def parse_timestamp(value: str | None):
+    if not value:
+        return None
+    return _as_utc(datetime.fromisoformat(value))
+
+
+# Stored for imported rows that arrive without a timestamp, so they stay
+# the oldest version (instead of getting "now" from the column default
+# and winning every later merge)
+OLDEST = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _newer(incoming: datetime | None, current: datetime | None) -> bool:
+    """Last writer wins; rows without a timestamp are the oldest."""
+    if incoming is None:
+        return False
+    if current is None:
+        return True
+    return _as_utc(incoming) > _as_utc(current)
+
+
+# --------------------------------------
+# Export
+# --------------------------------------
+
+def iter_user_state(since: datetime | None = None):
+    """
+    Yield (table, row_dict) for every synced row,
+    or only rows changed after `since` (delta mode).
+    Rows are streamed from the DB in chunks.
+    """
+    db = SessionLocal()
+    try:
+        for table, (model, key, values) in SYNC_TABLES.items():
+            query = db.query(model)
+            if since is not None:
+                # (legacy NULL updated_at rows are stamped by init_db())
+                query = query.filter(model.updated_at > since)
+
+            for obj in query.order_by(model.id).yield_per(BATCH_SIZE):
+                row = {col: getattr(obj, col) for col in key + values}
+                updated_at = _as_utc(obj.updated_at)
+                row["updated_at"] = updated_at.isoformat() if updated_at else None
+                yield table, row
+    finally:
+        db.close()
+
+
+def export_user_state(fp, fmt: str = "ndjson", since: datetime | None = None):
+    """
+    Write user state to an open text file.
+    Returns the watermark to pass as `since` next time
+    (the newest updated_at written, or `since` if nothing changed).
+    """
+    watermark = since
+
+    if fmt == "csv":
+        writer = csv.DictWriter(fp, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+    elif fmt != "ndjson":
+        raise ValueError(f"Unknown format: {fmt}")
+
+    for table, row in iter_user_state(since):
+        ts = parse_timestamp(row["updated_at"])
+        if ts is not None and (watermark is None or ts > watermark):
+            watermark = ts
+
+        if fmt == "csv":
+            writer.writerow({"table": table, **row})
+        else:
+            fp.write(json.dumps({"table": table, **row}, ensure_ascii=False))
+            fp.write("\n")
+
+    return watermark
+
+
+# --------------------------------------
+# Import
+# --------------------------------------
+
+def iter_records(fp, fmt: str = "ndjson"):
+    """Yield (table, row_dict) from an NDJSON or CSV export."""
+    if fmt == "csv":
+        source = csv.DictReader(fp)
+    elif fmt == "ndjson":
+        source = (json.loads(line) for line in fp if line.strip())
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+
+    for record in source:
+        table = record.pop("table")
+        if table not in SYNC_TABLES:
+            continue
+
+        _, key, values = SYNC_TABLES[table]
+        row = {}
+        for col in key + values:
+            value = record.get(col)
+            if value in ("", None):
+                value = None
+            elif col in INT_COLUMNS:
+                value = int(value)
+            row[col] = value
+        row["updated_at"] = parse_timestamp(record.get("updated_at"))
+        yield table, row
+
+
+def _merge_batch(db, table: str, rows: list, known_album_ids: set,
+                 stats: dict, changed_tables: set):
+    model, key, values = SYNC_TABLES[table]
+
+    # skip rows pointing to albums this catalog does not have
+    if "album_id" in key:
+        rows = [r for r in rows if r["album_id"] in known_album_ids]
+    if table == "user_settings":
+        for r in rows:
+            if r["last_album_id"] not in known_album_ids:
+                r["last_album_id"] = None
+    if not rows:
+        return
+
+    # load existing rows for the whole batch with one query
+    # (IN per key column, exact key matched below)
+    candidates = db.query(model).filter(
+        *[getattr(model, col).in_({r[col] for r in rows}) for col in key]
+    )
+    existing = {}
+    for obj in candidates:
+        existing.setdefault(tuple(getattr(obj, col) for col in key), obj)
+
+    for row in rows:
+        row_key = tuple(row[col] for col in key)
+        obj = existing.get(row_key)
+
+        if obj is None:
+            obj = model(**{**row, "updated_at": row["updated_at"] or OLDEST})
+            db.add(obj)
+            existing[row_key] = obj
+            stats["inserted"] += 1
+            changed_tables.add(table)
+        elif _newer(row["updated_at"], obj.updated_at):
+            for col in values:
+                setattr(obj, col, row[col])
+            # set explicitly, so onupdate does not replace it with "now"
+            obj.updated_at = row["updated_at"]
+            stats["updated"] += 1
+            changed_tables.add(table)
+        else:
+            stats["skipped"] += 1
+
+
+def import_user_state(fp, fmt: str = "ndjson"):
+    """
+    Merge an export into the local DB, last-writer-wins on updated_at.
+    Everything is applied in a single transaction.
+    Returns counts: {"inserted": .., "updated": .., "skipped": ..}.
+    """
+    stats = {"inserted": 0, "updated": 0, "skipped": 0}
+    changed_tables = set()
+
+    db = SessionLocal()
+    try:
+        known_album_ids = {row.id for row in db.query(Album.id)}
+
+        batches = {table: [] for table in SYNC_TABLES}
+        for table, row in iter_records(fp, fmt):
+            batches[table].append(row)
+            if len(batches[table]) >= BATCH_SIZE:
+                _merge_batch(db, table, batches[table], known_album_ids, stats, changed_tables)
+                db.flush()
+                batches[table] = []
+
+        for table, rows in batches.items():
+            if rows:
+                _merge_batch(db, table, rows, known_album_ids, stats, changed_tables)
+
+        if changed_tables & {"user_albums", "user_settings"}:
+            bump_version(db, "user_state")
+        if "user_albums" in changed_tables:
+            bump_version(db, "user_flags")
+        if "album_links" in changed_tables:
+            bump_version(db, "catalog")
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    return stats
+
+
+# --------------------------------------
+# Command line
+# --------------------------------------
+
+def _guess_format(path: str, fmt: str | None):
+    if fmt:
+        return fmt
+    return "csv" if path.lower().endswith(".csv") else "ndjson"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export / import Undead Archive user state.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    exp = sub.add_parser("export", help="write user state to a file ('-' for stdout)")
+    exp.add_argument("path")
+    exp.add_argument("--format", choices=("ndjson", "csv"))
+    exp.add_argument("--since", help="only rows changed after this ISO timestamp (delta mode)")
+
+    imp = sub.add_parser("import", help="merge an export into the local DB")
+    imp.add_argument("path")
+    imp.add_argument("--format", choices=("ndjson", "csv"))
+
+    args = parser.parse_args(argv)
+    init_db()
+    fmt = _guess_format(args.path, args.format)
+
+    if args.command == "export":
+        since = parse_timestamp(args.since)
+        if args.path == "-":
+            watermark = export_user_state(sys.stdout, fmt, since)
+        else:
+            with open(args.path, "w", encoding="utf-8", newline="") as fp:
+                watermark = export_user_state(fp, fmt, since)
+        # keep stdout clean for the data itself
+        print(f"watermark: {watermark.isoformat() if watermark else '-'}", file=sys.stderr)
+    else:
+        if args.path == "-":
+            stats = import_user_state(sys.stdin, fmt)
+        else:
+            with open(args.path, encoding="utf-8", newline="") as fp:
+                stats = import_user_state(fp, fmt)
+        print(
+            f"inserted: {stats['inserted']}, updated: {stats['updated']}, "
+            f"skipped: {stats['skipped']}"
+        )
+
+
+if __name__ == "__main__":
+    main()